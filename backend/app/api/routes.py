@@ -1,113 +1,359 @@
-from fastapi import APIRouter, HTTPException,Depends,Header 
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException,Depends,Header,Request,Response,Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from uuid import UUID
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse,ReplyIn
-from app.services.datamall import *
+from app.schemas.fare import FareRequest
+from app.services.datamall_async import *
 from app.services.dbconfig import *
+from app.services.spatial import index_for
+from app.services.routing import graph_for, DAY_TYPES
+from app.services.fares import engine_for
+from app.services.encoding import encoded_body
+from app.services.records import record_index_for, DEFAULT_LIMIT, MAX_LIMIT
+from app.services.export import encode_rows, EXPORT_FORMATS
+from app.services.heatmap import heatmap_for, MIN_ZOOM, MAX_ZOOM
+from app.services import broadcast
+from app.services.crowd_history import history, window_bounds
 
 router = APIRouter()
 
+def with_data_age(response: Response, data):
+    # Tell the client how old the (possibly stale) DataMall data is
+    age = data_age.get()
+    if age is not None:
+        response.headers["X-Data-Age"] = str(int(age))
+    return data
+
+async def dataset_response(request: Request, key: str, data):
+    # Serialised and compressed once per dataset version, 304 when the client has it
+    body = await encoded_body(key, data)
+    headers = {"ETag": body.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    age = data_age.get()
+    if age is not None:
+        headers["X-Data-Age"] = str(int(age))
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    encoding = body.negotiate(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body.variants[encoding], media_type="application/json", headers=headers)
+
+def split_values(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+async def dataset_page(response: Response, name: str, data, filters, fields, cursor, limit):
+    # A filtered, projected slice of a bulk dataset, served from its precomputed index
+    filters = {field: split_values(value) for field, value in filters.items() if value}
+    index = await asyncio.to_thread(record_index_for, name, data)
+    try:
+        items, next_cursor = index.query(filters, split_values(fields), cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return with_data_age(response, {"items": items, "next_cursor": next_cursor})
+
+PAGE_PARAMS = ("fields", "cursor", "limit")
+
 @router.get("/busstops")
-def bus_stops():
+async def bus_stops(request: Request, response: Response,
+                    fields: str | None = Query(None, description="Comma separated fields to return"),
+                    cursor: str | None = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                    BusStopCode: str | None = None, RoadName: str | None = None):
     try:
-        data = get_bus_stops()
-        return data
+        data = await get_bus_stops()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    filters = {"BusStopCode": BusStopCode, "RoadName": RoadName}
+    if not any(p in request.query_params for p in PAGE_PARAMS + tuple(filters)):
+        return await dataset_response(request, "BusStops", data)
+    return await dataset_page(response, "BusStops", data, filters, fields, cursor, limit)
     
+def with_distance(hits):
+    return [{**stop, "DistanceM": round(d, 1)} for d, stop in hits]
+
+@router.get("/busstops/nearest")
+async def bus_stops_nearest(response: Response, lat: float, lng: float, k: int = Query(10, ge=1, le=100)):
+    stops = await get_bus_stops()
+    hits = index_for("BusStops", stops).nearest(lat, lng, k)
+    return with_data_age(response, with_distance(hits))
+
+@router.get("/busstops/within")
+async def bus_stops_within(response: Response, lat: float, lng: float,
+                           radius: float = Query(500, gt=0, le=5000), limit: int = Query(200, ge=1, le=1000)):
+    stops = await get_bus_stops()
+    hits = index_for("BusStops", stops).within_radius(lat, lng, radius, limit)
+    return with_data_age(response, with_distance(hits))
+
+@router.get("/busstops/bbox")
+async def bus_stops_bbox(response: Response, south: float, west: float, north: float, east: float,
+                         limit: int = Query(500, ge=1, le=5000)):
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="Expected south <= north and west <= east")
+    stops = await get_bus_stops()
+    return with_data_age(response, index_for("BusStops", stops).within_bbox(south, west, north, east, limit))
+
+SGT = timezone(timedelta(hours=8))
+
+@router.get("/journeys")
+async def plan_journeys(response: Response, origin: str, destination: str,
+                        max_transfers: int = Query(2, ge=0, le=4),
+                        depart_at: str | None = Query(None, pattern=r"^\d{2}:\d{2}$"),
+                        day: str | None = None):
+    # Bus-only journeys between two stop codes, planned in-process from BusRoutes
+    now = datetime.now(SGT)
+    if day is None:
+        day = {5: "SAT", 6: "SUN"}.get(now.weekday(), "WD")
+    if day not in DAY_TYPES:
+        raise HTTPException(status_code=400, detail=f"day must be one of {', '.join(DAY_TYPES)}")
+    hours, minutes = map(int, depart_at.split(":")) if depart_at else (now.hour, now.minute)
+
+    routes = await get_bus_routes()
+    stops = await get_bus_stops()
+    if not routes:
+        raise HTTPException(status_code=503, detail="Bus routes are not available")
+    graph = await asyncio.to_thread(graph_for, routes, stops)
+    try:
+        journeys = await asyncio.to_thread(
+            graph.plan, origin, destination, max_transfers, hours * 60 + minutes, day
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"origin": origin, "destination": destination, "day": day, "journeys": journeys}
+
+@router.post("/fares")
+async def price_fares(body: FareRequest):
+    # Price many journeys in one call from the BusRoutes distance tables
+    routes = await get_bus_routes()
+    if not routes:
+        raise HTTPException(status_code=503, detail="Bus routes are not available")
+    engine = await asyncio.to_thread(engine_for, routes)
+    journeys = [journey.model_dump(by_alias=True) for journey in body.journeys]
+    return {"results": engine.price(journeys, body.fare_type)}
+
+@router.get("/busarrivals")
+async def bus_arrivals_batch(codes: str = Query(..., description="Comma separated bus stop codes"),
+                             services: str | None = Query(None, description="Comma separated service numbers")):
+    # One round trip for every stop on the map instead of one request per stop
+    stop_codes = list(dict.fromkeys(c.strip() for c in codes.split(",") if c.strip()))
+    if not stop_codes or len(stop_codes) > 50:
+        raise HTTPException(status_code=400, detail="Between 1 and 50 bus stop codes are required")
+    wanted = {s.strip() for s in services.split(",") if s.strip()} if services else None
+
+    now = datetime.now(timezone.utc)
+    arrivals = await get_bus_arrivals_batch(stop_codes)
+    stops = []
+    for code in stop_codes:
+        found, age = arrivals[code]
+        if wanted is not None:
+            found = [s for s in found if s.get("ServiceNo") in wanted]
+        stops.append({
+            "BusStopCode": code,
+            "Services": found,
+            "AgeSeconds": None if age is None else int(age),
+            "FetchedAt": None if age is None else (now - timedelta(seconds=age)).isoformat(),
+        })
+    return {"generated_at": now.isoformat(), "stops": stops}
+
 @router.get("/busarrivals/{busStopCode}")
-def bus_arrivals(busStopCode:str):
+async def bus_arrivals(busStopCode:str, response: Response):
     try:
-        data = get_bus_arrivals(busStopCode)
-        return data
+        data = await get_bus_arrivals(busStopCode)
+        return with_data_age(response, data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/busservices")
-def bus_services():
+async def bus_services(request: Request, response: Response,
+                       fields: str | None = Query(None, description="Comma separated fields to return"),
+                       cursor: str | None = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                       ServiceNo: str | None = None, Direction: str | None = None,
+                       Operator: str | None = None, Category: str | None = None):
     try:
-        data = get_bus_services()
-        return data
+        data = await get_bus_services()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    filters = {"ServiceNo": ServiceNo, "Direction": Direction, "Operator": Operator, "Category": Category}
+    if not any(p in request.query_params for p in PAGE_PARAMS + tuple(filters)):
+        return await dataset_response(request, "BusServices", data)
+    return await dataset_page(response, "BusServices", data, filters, fields, cursor, limit)
     
 @router.get("/busroutes")
-def bus_routes():
+async def bus_routes(request: Request, response: Response,
+                     fields: str | None = Query(None, description="Comma separated fields to return"),
+                     cursor: str | None = None, limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+                     ServiceNo: str | None = None, Direction: str | None = None,
+                     BusStopCode: str | None = None, Operator: str | None = None):
     try:
-        data = get_bus_routes()
-        return data
+        data = await get_bus_routes()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    filters = {"ServiceNo": ServiceNo, "Direction": Direction, "BusStopCode": BusStopCode, "Operator": Operator}
+    if not any(p in request.query_params for p in PAGE_PARAMS + tuple(filters)):
+        return await dataset_response(request, "BusRoutes", data)
+    return await dataset_page(response, "BusRoutes", data, filters, fields, cursor, limit)
     
+@router.get("/stationcrowddensityrealtime")
+async def station_crowddensityrealtime_all():
+    # All lines in one response; each line is cached for the 10 minute PCD cadence
+    return {"lines": await get_station_crowd_density_all_lines()}
+
+@router.get("/stationcrowddensityforecast")
+async def station_crowddensityforecast_all():
+    return {"lines": await get_station_crowd_density_all_lines(forecast=True)}
+
 @router.get("/stationcrowddensityrealtime/{train_line}")
-def station_crowddensityrealtime(train_line:str):
+async def station_crowddensityrealtime(train_line:str, request: Request):
     try:
-        data = get_station_crowd_density_realtime(train_line)
-        return data
+        data = await get_station_crowd_density_realtime(train_line)
+        return await dataset_response(request, f"PCDRealTime:{train_line}", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@router.get("/stream/trainservicealerts")
+async def stream_train_service_alerts():
+    # Server-Sent Events: a snapshot, then only changes as DataMall is polled
+    if not broadcast.train_service_alerts.parts:
+        await get_train_service_alerts()
+    return StreamingResponse(broadcast.train_service_alerts.events(),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/stream/crowddensity")
+async def stream_crowd_density(lines: str | None = Query(None, description="Comma separated train lines")):
+    wanted = {l.strip().upper() for l in lines.split(",") if l.strip()} if lines else None
+    if wanted and not wanted <= set(TRAIN_LINES):
+        raise HTTPException(status_code=400, detail=f"lines must be among {', '.join(TRAIN_LINES)}")
+    if len(broadcast.crowd_density.parts) < len(wanted or TRAIN_LINES):
+        await get_station_crowd_density_all_lines()
+    return StreamingResponse(broadcast.crowd_density.events(wanted),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.get("/stationcrowddensityforecast/{train_line}")
-def station_crowddensityforecast(train_line:str):
+async def station_crowddensityforecast(train_line:str, request: Request):
     try:
-        data = get_station_crowd_density_forecast(train_line)
-        return data
+        data = await get_station_crowd_density_forecast(train_line)
+        return await dataset_response(request, f"PCDForecast:{train_line}", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def history_window(line, start, end):
+    if line is not None and line.upper() not in TRAIN_LINES:
+        raise HTTPException(status_code=400, detail=f"line must be one of {', '.join(TRAIN_LINES)}")
+    start, end = window_bounds(start, end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return (line.upper() if line else None), start, end
+
+@router.get("/crowdhistory/averages")
+async def crowd_history_averages(line: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                                 kind: str = Query("realtime", pattern="^(realtime|forecast)$")):
+    # Per station mean crowd level over a window (default: the last 7 days)
+    line, start, end = history_window(line, start, end)
+    stations = await asyncio.to_thread(history.averages, start, end, line, kind)
+    return {"start": start, "end": end, "kind": kind, "stations": stations}
+
+@router.get("/crowdhistory/peaks")
+async def crowd_history_peaks(line: str | None = None, start: datetime | None = None, end: datetime | None = None,
+                              top: int = Query(3, ge=1, le=24),
+                              days: str = Query("all", pattern="^(all|weekday|weekend)$")):
+    # Hour of day profile (SGT) per station and its busiest hours
+    line, start, end = history_window(line, start, end)
+    stations = await asyncio.to_thread(history.peak_hours, start, end, line, top, days)
+    return {"start": start, "end": end, "days": days, "stations": stations}
+
+@router.get("/crowdhistory/forecasterror")
+async def crowd_history_forecast_error(line: str | None = None, start: datetime | None = None,
+                                       end: datetime | None = None):
+    # How far PCDForecast was from what PCDRealTime then reported
+    line, start, end = history_window(line, start, end)
+    return {"start": start, "end": end, **await asyncio.to_thread(history.forecast_error, start, end, line)}
+
 @router.get("/taxiavailability")
-def taxi_availability():
+async def taxi_availability(request: Request):
     try:
-        data = get_taxi_availability()
-        return data
+        data = await get_taxi_availability()
+        return await dataset_response(request, "TaxiAvailability", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@router.get("/taxiavailability/heatmap")
+async def taxi_availability_heatmap(response: Response, zoom: int = Query(14, ge=MIN_ZOOM, le=MAX_ZOOM),
+                                    south: float | None = None, west: float | None = None,
+                                    north: float | None = None, east: float | None = None):
+    # Taxi counts per map tile instead of thousands of raw coordinates
+    bbox = (south, west, north, east)
+    if any(v is None for v in bbox) and any(v is not None for v in bbox):
+        raise HTTPException(status_code=400, detail="Give all of south, west, north and east, or none")
+    if south is not None and (south > north or west > east):
+        raise HTTPException(status_code=400, detail="Expected south <= north and west <= east")
+    taxis = await get_taxi_availability()
+    heatmap = heatmap_for(taxis)
+    tiles = heatmap.tiles(zoom, south, west, north, east)
+    return with_data_age(response, {"zoom": zoom, "total": len(heatmap), "tiles": tiles})
+
+@router.get("/taxistands/nearest")
+async def taxi_stands_nearest(response: Response, lat: float, lng: float, k: int = Query(5, ge=1, le=50),
+                              radius: float = Query(500, gt=0, le=5000)):
+    # Closest stands, each with the number of available taxis within `radius` metres of it
+    stands = await get_taxi_stands()
+    hits = index_for("TaxiStands", stands).nearest(lat, lng, k)
+    taxis = await get_taxi_availability()
+    nearby = heatmap_for(taxis).count_within(
+        [float(s["Latitude"]) for _, s in hits], [float(s["Longitude"]) for _, s in hits], radius
+    )
+    results = with_distance(hits)
+    for stand, count in zip(results, nearby):
+        stand["TaxisNearby"] = int(count)
+    return with_data_age(response, results)
+
 @router.get("/taxistands")
-def taxi_stands():
+async def taxi_stands(request: Request):
     try:
-        data = get_taxi_stands()
-        return data
+        data = await get_taxi_stands()
+        return await dataset_response(request, "TaxiStands", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/trainservicealerts")
-def train_service_alerts():
+async def train_service_alerts(request: Request):
     try:
-        data = get_train_service_alerts()
-        return data
+        data = await get_train_service_alerts()
+        return await dataset_response(request, "TrainServiceAlerts", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/estimatedtraveltimes")
-def estimatedtraveltimes():
+async def estimatedtraveltimes(request: Request):
     try:
-        data = get_estimated_travel_times()
-        return data
+        data = await get_estimated_travel_times()
+        return await dataset_response(request, "EstTravelTimes", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/trafficimages")
-def traffic_images():
+async def traffic_images(request: Request):
     try:
-        data = get_traffic_images()
-        return data
+        data = await get_traffic_images()
+        return await dataset_response(request, "TrafficImages", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/trafficincidents")
-def traffic_incidents():
+async def traffic_incidents(request: Request):
     try:
-        data = get_traffic_incidents()
-        return data
+        data = await get_traffic_incidents()
+        return await dataset_response(request, "TrafficIncidents", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/geospatialwholeisland/{id}")
-def station_crowddensityforecast(id:str):
+async def station_crowddensityforecast(id:str, request: Request):
     try:
-        data = get_geospacial_whole_island(id)
-        return data
+        data = await get_geospacial_whole_island(id)
+        return await dataset_response(request, f"GeospatialWholeIsland:{id}", data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -119,7 +365,7 @@ async def create_user(user: UserCreate):
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def read_user(user_id: UUID):
     #basic checking to see if db can be accessed
-    resp = get_specific_user(user_id)
+    resp = await get_specific_user(user_id)
     return resp.data
     # Logic to read a user by ID
     pass
@@ -127,11 +373,30 @@ async def read_user(user_id: UUID):
 @router.get("/users/", response_model=list[UserResponse])
 async def read_users():
     #basic checking to see if db can be accessed
-    resp=supabase.table("users").select("*").execute()
+    resp=await supabase.table("users").select("*").execute()
     return resp.data
     # Logic to read all users
     pass
 
+USER_EXPORT_FIELDS = ["uid", "username", "email"]
+FEEDBACK_EXPORT_FIELDS = ["id", "created_at", "title", "description", "type", "rating", "user_id", "username"]
+
+def export_response(chunks, name: str, format: str, fields):
+    # Streamed chunk by chunk from Supabase, so memory does not grow with the table
+    return StreamingResponse(
+        encode_rows(chunks, format, fields),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
+    )
+
+@router.get("/export/users")
+async def export_users(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), _: UUID = Depends(require_admin)):
+    return export_response(iter_users(), "users", format, USER_EXPORT_FIELDS)
+
+@router.get("/export/feedback")
+async def export_feedback(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), _: UUID = Depends(require_admin)):
+    return export_response(iter_feedbacks(), "feedback", format, FEEDBACK_EXPORT_FIELDS)
+
 @router.put("/users/{user_id}", response_model=UserResponse)
 async def update_user(user_id: UUID, user: UserCreate):
     # Logic to update a user by ID
@@ -143,42 +408,64 @@ async def delete_user(user_id: int):
     pass
 
 @router.get("/feedbacks/")
-async def read_feedbacks():
-    resp = list_feedbacks()
-    return resp
+async def read_feedbacks(request: Request, limit: int = Query(50, ge=1, le=500), cursor: str | None = None,
+                         type: str | None = None, rating: int | None = Query(None, ge=1, le=5),
+                         since: datetime | None = None, until: datetime | None = None,
+                         search: str | None = Query(None, max_length=100, description="Matches title or description")):
+    # Rows come straight from PostgREST as plain JSON, so skip jsonable_encoder
+    if not request.query_params:
+        return ORJSONResponse(await list_feedbacks())
+    # Paged: {"items", "next_cursor"}, pass next_cursor back as cursor for the next page
+    try:
+        rows, next_cursor = await list_feedbacks_page(
+            limit, cursor, type, rating,
+            since.isoformat() if since else None, until.isoformat() if until else None, search,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse({"items": rows, "next_cursor": next_cursor})
+
+@router.get("/feedbacks/replies")
+async def read_feedback_replies_batch(ids: str = Query(..., description="Comma separated feedback ids")):
+    # Replies of a whole page of feedback in one query instead of one request per feedback
+    try:
+        feedback_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    if not feedback_ids or len(feedback_ids) > 500:
+        raise HTTPException(status_code=400, detail="Between 1 and 500 feedback ids are required")
+    return ORJSONResponse(await list_replies_batch(feedback_ids))
 
 @router.delete("/feedbacks/{feedback_id}")
 async def delete_feedback_entry(feedback_id: int):
-    resp = delete_feedback(feedback_id)
+    resp = await delete_feedback(feedback_id)
     return {"message": "Feedback deleted successfully", "data": resp.data}
 
 
 @router.get("/feedbacks/{feedback_id}/replies")
 async def read_feedback_resplies(feedback_id: int):
-    resp = list_replies(feedback_id)
+    resp = await list_replies(feedback_id)
     return resp
 
 @router.delete("/feedbacks/{feedback_id}/replies/{reply_id}")
 async def delete_feedback_reply(feedback_id: int, reply_id: int):
-    resp = delete_reply(reply_id)
+    resp = await delete_reply(reply_id)
     return {"message": "Reply deleted successfully", "data": resp.data}
 
 
 @router.post("/feedbacks/{fid}/replies", status_code=201)
-def create_reply(fid: int, body: ReplyIn, user_uuid: UUID = Depends(get_current_user_uuid)):
+async def create_reply(fid: int, body: ReplyIn, user_uuid: UUID = Depends(get_current_user_uuid)):
     msg = (body.content or "").strip()
     if not msg:
         raise HTTPException(status_code=400, detail="Reply content cannot be empty")
 
     ins = {"feedback_id": fid, "user_id": str(user_uuid), "content": msg}
-    print("DEBUG insert payload:", ins)  # TEMP
 
     try:
-        resp = supabase.table("replies").insert(ins).execute()
-        print("DEBUG insert resp:", resp.data)  # TEMP
+        resp = await supabase.table("replies").insert(ins).execute()
     except Exception as e:
         # This will show the exact FK/constraint error from PostgREST/Postgres
-        print("DEBUG insert error:", repr(e))
+        print("Error inserting reply:", repr(e))
         raise HTTPException(status_code=500, detail="Insert failed")
 
     row = (resp.data or [None])[0]
@@ -192,8 +479,8 @@ def create_reply(fid: int, body: ReplyIn, user_uuid: UUID = Depends(get_current_
         "user_id": row["user_id"],
     }
 @router.delete("/UserProfile")
-def delete_user_account(uid: UUID = Depends(get_current_user_uuid)):
-    resp = delete_account(uid)
+async def delete_user_account(uid: UUID = Depends(get_current_user_uuid)):
+    resp = await delete_account(uid)
     return {"message": "Account deleted successfully"}
 
     
\ No newline at end of file
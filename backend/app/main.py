@@ -1,8 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from app.api.routes import router
+from app.services.datamall_async import close_async_client, warm_start
+from app.services.scheduler import PrefetchScheduler
+from app.services.dbconfig import close_db_clients
+from app.services import metrics
+from app.services.encoding import NegotiatedGZipMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve static datasets from the last on-disk snapshot straight away
+    warm_start()
+    # Keep realtime and static datasets warm so requests never wait on DataMall
+    scheduler = PrefetchScheduler()
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    # Release the pooled DataMall connections on shutdown
+    await close_async_client()
+    await close_db_clients()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.include_router(router, prefix="/api")
 origins = ["http://localhost:5173", "http://127.0.0.1:5173"]
 
@@ -13,8 +35,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Data-Age", "ETag"],
 )
+# Compress everything else; dataset routes send precompressed bodies and are left alone
+app.add_middleware(NegotiatedGZipMiddleware, minimum_size=1000, compresslevel=6)
+# Outermost, so the recorded time includes compression and CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the FastAPI backend!"}
\ No newline at end of file
+    return {"message": "Welcome to the FastAPI backend!"}
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    # Prometheus scrape endpoint
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class FareLeg(BaseModel):
+    ServiceNo: str
+    Direction: Optional[int] = None
+    board: str = Field(alias="from")
+    alight: str = Field(alias="to")
+
+class FareJourney(BaseModel):
+    legs: list[FareLeg] = Field(min_length=1)
+    fare_type: Optional[str] = None
+
+class FareRequest(BaseModel):
+    fare_type: str = "adult"
+    journeys: list[FareJourney] = Field(min_length=1, max_length=1000)
@@ -0,0 +1,97 @@
+"""Local verification of Supabase access tokens.
+
+Supabase access tokens are JWTs signed either with the project's shared
+secret (HS256, SUPABASE_JWT_SECRET) or with an asymmetric key published at
+the project's JWKS endpoint. Verifying them here avoids an Auth API round
+trip per request. The Auth API is still asked when a token cannot be checked
+locally: no secret configured, a key id we cannot find even after refreshing
+the JWKS, or a signature that fails against a secret that may have rotated.
+Verified tokens are remembered briefly so repeat requests skip the crypto too.
+"""
+import os
+import threading
+import time
+from uuid import UUID
+
+import jwt
+from jwt import PyJWKClient
+
+from app.services.cache import TTLCache
+
+JWT_AUDIENCE = "authenticated"
+JWKS_LIFESPAN = int(os.getenv("SUPABASE_JWKS_LIFESPAN", "600"))
+TOKEN_CACHE_TTL = float(os.getenv("SUPABASE_TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_SIZE = 4096
+ASYMMETRIC_ALGS = ("RS256", "ES256")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class TokenVerifier:
+    def __init__(self, supabase_url: str, jwt_secret: str = None, remote_verify=None):
+        """remote_verify(token) -> user id, used when local verification is not possible."""
+        self.jwt_secret = jwt_secret
+        self.remote_verify = remote_verify
+        self.jwks = PyJWKClient(
+            f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            cache_keys=True, lifespan=JWKS_LIFESPAN, timeout=5,
+        ) if supabase_url else None
+        self.verified = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+        self._lock = threading.Lock()
+
+    def _decode(self, token: str):
+        """Claims of a locally verified token, None if it cannot be checked here."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+        alg = header.get("alg")
+        if alg == "HS256":
+            if not self.jwt_secret:
+                return None
+            key = self.jwt_secret
+        elif alg in ASYMMETRIC_ALGS:
+            if self.jwks is None or not header.get("kid"):
+                return None
+            try:
+                # refetches the JWKS once when the kid is unknown (key rotation)
+                key = self.jwks.get_signing_key(header["kid"]).key
+            except jwt.PyJWKClientError:
+                return None
+        else:
+            raise InvalidToken(f"Unsupported algorithm {alg}")
+        try:
+            return jwt.decode(token, key, algorithms=[alg], audience=JWT_AUDIENCE,
+                              options={"require": ["exp", "sub"]})
+        except jwt.InvalidSignatureError:
+            # a rotated shared secret looks exactly like a forged token, let Supabase decide
+            return None
+        except jwt.InvalidTokenError as e:
+            raise InvalidToken(str(e))
+
+    def verify(self, token: str) -> UUID:
+        with self._lock:
+            entry = self.verified.peek(token)
+        if entry is not None and entry.fresh:
+            return entry.value
+
+        claims = self._decode(token)
+        if claims is not None:
+            uid = UUID(claims["sub"])
+            ttl = min(TOKEN_CACHE_TTL, claims["exp"] - time.time())
+        elif self.remote_verify is not None:
+            try:
+                uid = UUID(str(self.remote_verify(token)))
+            except Exception as e:
+                raise InvalidToken(str(e))
+            expires = jwt.decode(token, options={"verify_signature": False}).get("exp", 0)
+            ttl = min(TOKEN_CACHE_TTL, expires - time.time())
+        else:
+            raise InvalidToken("Token cannot be verified")
+
+        if ttl > 0:
+            with self._lock:
+                self.verified.set(token, uid, ttl)
+        return uid
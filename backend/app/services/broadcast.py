@@ -0,0 +1,113 @@
+"""Fan-out of DataMall changes to Server-Sent Event subscribers.
+
+DataMall is polled once (by the prefetch scheduler, or on demand) and every
+successful load is reported here through datamall_async.dataset_listeners.
+Each topic diffs the new records against what it last published and pushes
+only the difference to its subscribers, so the upstream cost is the same for
+one open tab or ten thousand.
+"""
+import asyncio
+import json
+
+from app.services import datamall_async
+
+SUBSCRIBER_QUEUE_SIZE = 32
+HEARTBEAT_SECONDS = 15
+
+
+class Subscriber:
+    def __init__(self, parts=None):
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.parts = parts          # only receive updates for these keys, None for all
+
+    def push(self, key, message: str):
+        if self.parts is not None and key not in self.parts:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog, None tells it to resync from a snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class Topic:
+    """Latest state of a feed, split into parts (e.g. one per train line).
+
+    A part is either a list of records indexed by `record_key`, diffed record
+    by record, or any other JSON value that is replaced as a whole.
+    """
+
+    def __init__(self, name: str, record_key: str = None):
+        self.name = name
+        self.record_key = record_key
+        self.parts = {}
+        self.version = 0
+        self.subscribers = set()
+
+    def _index(self, records):
+        if self.record_key and isinstance(records, list):
+            return {r.get(self.record_key): r for r in records}
+        return records
+
+    def publish(self, key, records):
+        new = self._index(records)
+        old = self.parts.get(key)
+        if old == new:
+            return
+        if isinstance(new, dict) and isinstance(old, dict) and self.record_key:
+            change = {
+                "upsert": [row for k, row in new.items() if old.get(k) != row],
+                "remove": [k for k in old if k not in new],
+            }
+        else:
+            change = {"replace": records}
+        self.parts[key] = new
+        self.version += 1
+        # encoded once, however many subscribers there are
+        message = sse("update", {"version": self.version, "key": key, **change})
+        for subscriber in list(self.subscribers):
+            subscriber.push(key, message)
+
+    def snapshot(self, parts=None):
+        data = {
+            key: list(value.values()) if self.record_key and isinstance(value, dict) else value
+            for key, value in self.parts.items()
+            if parts is None or key in parts
+        }
+        return {"version": self.version, "data": data}
+
+    async def events(self, parts=None):
+        """SSE stream: a snapshot first, then one event per change."""
+        subscriber = Subscriber(parts)
+        self.subscribers.add(subscriber)
+        try:
+            yield sse("snapshot", self.snapshot(parts))
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse("snapshot", self.snapshot(parts)) if message is None else message
+        finally:
+            self.subscribers.discard(subscriber)
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+train_service_alerts = Topic("trainservicealerts")
+crowd_density = Topic("crowddensity", record_key="Station")
+
+
+def on_dataset_update(name, value, records):
+    if name == "TrainServiceAlerts":
+        train_service_alerts.publish("alerts", records)
+    elif name == "PCDRealTime":
+        crowd_density.publish(value, records)
+
+
+datamall_async.dataset_listeners.append(on_dataset_update)
@@ -0,0 +1,94 @@
+"""In-process TTL cache with LRU eviction and single-flight loading."""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheEntry:
+    value: object
+    stored_at: float
+    ttl: float
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.age < self.ttl
+
+
+@dataclass
+class Aged:
+    """Loader result that was already `age` seconds old when loaded, e.g.
+    copied from another process instead of fetched."""
+    value: object
+    age: float
+
+
+class TTLCache:
+    """Bounded cache of async loader results.
+
+    Entries expire after their own TTL and the least recently used entry is
+    evicted once `maxsize` is reached. Concurrent misses on the same key share
+    one loader call: the first caller starts it and everyone else awaits the
+    same task.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key):
+        """Return the entry for key, fresh or not, without loading."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def loading(self, key) -> bool:
+        return key in self._inflight
+
+    def set(self, key, value, ttl: float, age: float = 0.0) -> CacheEntry:
+        entry = CacheEntry(value, time.monotonic() - age, ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_load(self, key, loader, ttl: float):
+        entry = self.peek(key)
+        if entry is not None and entry.fresh:
+            return entry.value
+        return (await self.load(key, loader, ttl)).value
+
+    async def load(self, key, loader, ttl: float) -> CacheEntry:
+        """Run loader for key, joining an in-flight load if there is one."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, loader, ttl))
+            self._inflight[key] = task
+        # shield: a cancelled caller must not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _run(self, key, loader, ttl):
+        try:
+            result = await loader()
+            if isinstance(result, Aged):
+                return self.set(key, result.value, ttl, age=result.age)
+            return self.set(key, result, ttl)
+        finally:
+            self._inflight.pop(key, None)
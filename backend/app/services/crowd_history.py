@@ -0,0 +1,323 @@
+"""History of DataMall station crowd density, kept for trend queries.
+
+Every PCDRealTime / PCDForecast load is appended to a small columnar store
+under CROWD_HISTORY_DIR, one directory per (kind, train line):
+
+    realtime/EWL/t.i8         interval start, epoch seconds
+    realtime/EWL/station.u2   index into stations.txt
+    realtime/EWL/level.i1     0 = NA, 1 = low, 2 = moderate, 3 = high
+    realtime/EWL/stations.txt one station code per line
+
+Files are only ever appended to, and only with (interval, station) pairs not
+stored yet, so re-polling the same interval (or several workers seeing the
+same load) adds nothing, while stations missing from an earlier load are
+still filled in. For forecasts this keeps the first version fetched of each
+interval: DataMall revises the day's forecast as it goes, and those later
+revisions are not stored. Each process reads the columns into NumPy once and
+afterwards only the rows appended since, keeping them sorted by time in
+memory; queries binary search the window and aggregate with bincount, which
+stays in the milliseconds over months of 10-minute samples.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services import datamall_async
+from app.services.datamall import TRAIN_LINES
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, no cross-worker lock needed
+    fcntl = None
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+HISTORY_DIR = os.getenv("CROWD_HISTORY_DIR", os.path.join(_BACKEND_DIR, "data", "crowd_history"))
+CROWD_HISTORY = os.getenv("CROWD_HISTORY", "1").lower() not in ("0", "false", "no")
+
+KINDS = {"PCDRealTime": "realtime", "PCDForecast": "forecast"}
+LEVELS = {"l": 1, "m": 2, "h": 3}
+COLUMNS = (("t", "<i8"), ("station", "<u2"), ("level", "i1"))
+SGT_OFFSET = 8 * 60 * 60
+FORECAST_SLOT = 30 * 60      # PCDForecast intervals are half-hourly
+# Singapore has no DST, so hour of day and weekday are plain arithmetic on
+# epoch seconds; 1970-01-01 was a Thursday (weekday 3).
+EPOCH_WEEKDAY = 3
+
+
+def _epoch(value) -> int:
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def parse_rows(records):
+    """(interval start, station, level) for both PCD response shapes, skipping
+    rows without a usable time."""
+    rows = []
+    for r in records:
+        if "Stations" in r:
+            for station in r.get("Stations") or []:
+                for interval in station.get("Interval") or []:
+                    rows.append((interval.get("Start"), station.get("Station"), interval.get("CrowdLevel")))
+        else:
+            rows.append((r.get("StartTime"), r.get("Station"), r.get("CrowdLevel")))
+    parsed = []
+    for start, station, level in rows:
+        if not start or not station:
+            continue
+        try:
+            parsed.append((_epoch(start), station, LEVELS.get(str(level).lower(), 0)))
+        except ValueError:
+            continue
+    return parsed
+
+
+class Series:
+    """The columns of one (kind, line), read once and then only the new tail."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.rows = 0
+        self.t = np.empty(0, "<i8")
+        self.station = np.empty(0, "<u2")
+        self.level = np.empty(0, "i1")
+        self.stations = []
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _stored_rows(self) -> int:
+        # a crash between column appends leaves the longer ones ragged; the
+        # shortest column is what was written completely
+        sizes = []
+        for name, dtype in COLUMNS:
+            try:
+                sizes.append(os.path.getsize(self._path(f"{name}.{dtype[-2:]}")) // np.dtype(dtype).itemsize)
+            except FileNotFoundError:
+                return 0
+        return min(sizes)
+
+    def refresh(self):
+        with self.lock:
+            rows = self._stored_rows()
+            if rows == self.rows:
+                return self
+            if rows < self.rows:  # truncated by hand, start over
+                self.rows = 0
+                self.t, self.station, self.level = (np.empty(0, dtype) for _, dtype in COLUMNS)
+            tails = {}
+            for name, dtype in COLUMNS:
+                size = np.dtype(dtype).itemsize
+                tails[name] = np.fromfile(self._path(f"{name}.{dtype[-2:]}"), dtype=dtype,
+                                          count=rows - self.rows, offset=self.rows * size)
+            tail_t = tails["t"]
+            in_order = not (np.any(np.diff(tail_t) < 0) or (self.rows and len(tail_t) and tail_t[0] < self.t[-1]))
+            for name, _ in COLUMNS:
+                setattr(self, name, np.concatenate([getattr(self, name), tails[name]]))
+            if not in_order:
+                # late rows for earlier intervals: re-sort so windows can binary search
+                order = np.argsort(self.t, kind="stable")
+                for name, _ in COLUMNS:
+                    setattr(self, name, getattr(self, name)[order])
+            with open(self._path("stations.txt"), encoding="utf-8") as f:
+                self.stations = f.read().splitlines()
+            self.rows = rows
+            return self
+
+    def window(self, start: int, end: int):
+        """(t, station, level, stations) for start <= t < end; t is sorted, so
+        the window is found with two binary searches."""
+        with self.lock:
+            t, station, level, stations = self.t, self.station, self.level, self.stations
+        lo, hi = np.searchsorted(t, [start, end])
+        return t[lo:hi], station[lo:hi].astype(np.int64), level[lo:hi].astype(np.int64), stations
+
+    def append(self, rows) -> int:
+        """Store the rows whose (interval, station) is not stored yet; returns how many."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock, open(self._path(".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self.refresh()
+            if not rows:
+                return 0
+            # only the stored rows from the batch's first interval on can clash
+            lo = int(np.searchsorted(self.t, min(t for t, _, _ in rows)))
+            seen = set(zip(self.t[lo:].tolist(), (self.stations[c] for c in self.station[lo:].tolist())))
+            fresh = []
+            for t, station, level in rows:
+                if (t, station) not in seen:
+                    seen.add((t, station))
+                    fresh.append((t, station, level))
+            rows = sorted(fresh)
+            if not rows:
+                return 0
+            codes = {name: i for i, name in enumerate(self.stations)}
+            new = [name for name in dict.fromkeys(station for _, station, _ in rows) if name not in codes]
+            if new:
+                with open(self._path("stations.txt"), "a", encoding="utf-8") as f:
+                    f.write("".join(f"{name}\n" for name in new))
+                codes.update(zip(new, range(len(codes), len(codes) + len(new))))
+            values = {
+                "t": [t for t, _, _ in rows],
+                "station": [codes[station] for _, station, _ in rows],
+                "level": [level for _, _, level in rows],
+            }
+            for name, dtype in COLUMNS:
+                with open(self._path(f"{name}.{dtype[-2:]}"), "ab") as f:
+                    f.write(np.asarray(values[name], dtype=dtype).tobytes())
+            self.refresh()
+            return len(rows)
+
+
+class CrowdHistory:
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, kind: str, line: str) -> Series:
+        with self._lock:
+            series = self._series.get((kind, line))
+            if series is None:
+                series = self._series[(kind, line)] = Series(os.path.join(self.directory, kind, line))
+            return series.refresh()
+
+    def append(self, name: str, line: str, records) -> int:
+        return self.series(KINDS[name], line).append(parse_rows(records))
+
+    def _lines(self, line):
+        return [line] if line else list(TRAIN_LINES)
+
+    def averages(self, start: int, end: int, line: str = None, kind: str = "realtime"):
+        """Per station: samples, mean level (1 low .. 3 high) and share of each level."""
+        results = []
+        for name in self._lines(line):
+            _, station, level, stations = self.series(kind, name).window(start, end)
+            valid = level > 0
+            station, level = station[valid], level[valid]
+            groups = len(stations)
+            samples = np.bincount(station, minlength=groups)
+            totals = np.bincount(station, weights=level, minlength=groups)
+            by_level = np.bincount(station * 4 + level, minlength=groups * 4).reshape(groups, 4)
+            for code in np.flatnonzero(samples):
+                n = samples[code]
+                results.append({
+                    "line": name, "station": stations[code], "samples": int(n),
+                    "mean_level": round(float(totals[code] / n), 3),
+                    "low": round(float(by_level[code, 1] / n), 3),
+                    "moderate": round(float(by_level[code, 2] / n), 3),
+                    "high": round(float(by_level[code, 3] / n), 3),
+                })
+        return results
+
+    def peak_hours(self, start: int, end: int, line: str = None, top: int = 3, days: str = "all"):
+        """Per station: mean level by hour of day (SGT) and the `top` busiest hours."""
+        results = []
+        for name in self._lines(line):
+            t, station, level, stations = self.series("realtime", name).window(start, end)
+            local = t + SGT_OFFSET
+            keep = level > 0
+            if days != "all":
+                weekday = (local // 86400 + EPOCH_WEEKDAY) % 7
+                keep &= (weekday >= 5) if days == "weekend" else (weekday < 5)
+            hour = (local[keep] // 3600) % 24
+            station, level = station[keep], level[keep]
+            groups = len(stations)
+            samples = np.bincount(station * 24 + hour, minlength=groups * 24).reshape(groups, 24)
+            totals = np.bincount(station * 24 + hour, weights=level, minlength=groups * 24).reshape(groups, 24)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = totals / samples
+            for code in np.flatnonzero(samples.sum(axis=1)):
+                profile = means[code]
+                ranked = [int(h) for h in np.argsort(-np.nan_to_num(profile, nan=-1.0))[:top] if samples[code, h]]
+                results.append({
+                    "line": name, "station": stations[code],
+                    "peak_hours": [{"hour": h, "mean_level": round(float(profile[h]), 3)} for h in ranked],
+                    "hourly": [None if np.isnan(m) else round(float(m), 3) for m in profile],
+                })
+        return results
+
+    def forecast_error(self, start: int, end: int, line: str = None):
+        """Each realtime sample against the forecast for its station and
+        half-hour slot: mean absolute error, bias (forecast - actual, in
+        levels) and share of exact matches, overall and per station.
+
+        The forecast is the first one stored for the slot, so this measures
+        the earliest fetched forecast, usually hours ahead, not the last
+        revision before the slot began."""
+        per_station, abs_error, signed = [], [], []
+        for name in self._lines(line):
+            a_t, a_station, a_level, a_names = self.series("realtime", name).window(start, end)
+            f_t, f_station, f_level, f_names = self.series("forecast", name).window(start - FORECAST_SLOT, end)
+            # the two stores number stations in their own order; compare by name
+            names = sorted(set(a_names) | set(f_names))
+            index = {s: i for i, s in enumerate(names)}
+            a_map = np.array([index[s] for s in a_names] or [0], dtype=np.int64)
+            f_map = np.array([index[s] for s in f_names] or [0], dtype=np.int64)
+
+            a_ok, f_ok = a_level > 0, f_level > 0
+            a_station, a_slot, a_level = a_map[a_station[a_ok]], a_t[a_ok] // FORECAST_SLOT, a_level[a_ok]
+            f_keys = f_map[f_station[f_ok]] << 40 | f_t[f_ok] // FORECAST_SLOT
+            f_level = f_level[f_ok]
+            order = np.argsort(f_keys, kind="stable")
+            f_keys, f_level = f_keys[order], f_level[order]
+
+            a_keys = a_station << 40 | a_slot
+            pos = np.searchsorted(f_keys, a_keys)
+            matched = pos < len(f_keys)
+            matched[matched] = f_keys[pos[matched]] == a_keys[matched]
+            diff = f_level[pos[matched]] - a_level[matched]
+            station = a_station[matched]
+            abs_error.append(np.abs(diff))
+            signed.append(diff)
+
+            groups = len(names)
+            n = np.bincount(station, minlength=groups)
+            abs_sum = np.bincount(station, weights=np.abs(diff), minlength=groups)
+            sum_diff = np.bincount(station, weights=diff, minlength=groups)
+            exact = np.bincount(station, weights=(diff == 0).astype(float), minlength=groups)
+            for code in np.flatnonzero(n):
+                per_station.append({
+                    "line": name, "station": names[code], "samples": int(n[code]),
+                    "mae": round(float(abs_sum[code] / n[code]), 3), "bias": round(float(sum_diff[code] / n[code]), 3),
+                    "exact": round(float(exact[code] / n[code]), 3),
+                })
+
+        abs_error = np.concatenate(abs_error) if abs_error else np.empty(0)
+        signed = np.concatenate(signed) if signed else np.empty(0)
+        overall = {
+            "samples": int(len(abs_error)),
+            "mae": round(float(abs_error.mean()), 3) if len(abs_error) else None,
+            "bias": round(float(signed.mean()), 3) if len(signed) else None,
+            "exact": round(float((abs_error == 0).mean()), 3) if len(abs_error) else None,
+        }
+        return {"overall": overall, "stations": per_station}
+
+
+history = CrowdHistory()
+_appends = set()
+
+
+def on_dataset_update(name, value, records):
+    if name not in KINDS or value not in TRAIN_LINES or not records:
+        return
+    # file appends and ISO parsing run off the event loop
+    task = asyncio.ensure_future(asyncio.to_thread(history.append, name, value, records))
+    _appends.add(task)
+    task.add_done_callback(_appends.discard)
+
+
+if CROWD_HISTORY:
+    datamall_async.dataset_listeners.append(on_dataset_update)
+
+
+def window_bounds(start: datetime = None, end: datetime = None, default_days: int = 7):
+    """Epoch seconds for a query window; naive datetimes are read as SGT."""
+    sgt = timezone(timedelta(seconds=SGT_OFFSET))
+    end = end or datetime.now(sgt)
+    start = start or end - timedelta(days=default_days)
+    start, end = (d if d.tzinfo else d.replace(tzinfo=sgt) for d in (start, end))
+    return int(start.timestamp()), int(end.timestamp())
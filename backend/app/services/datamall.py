@@ -1,345 +1,134 @@
 from dotenv import load_dotenv
-load_dotenv() 
+load_dotenv()
 
-import requests
 import os
+from dataclasses import dataclass
 
-DATAMALL_API_KEY = os.getenv("DATAMALL_API_KEY")
-
-def get_bus_stops():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/BusStops"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        # Debug info: status code and partial response
-        print("Status Code:", response.status_code)
-        print("Response snippet:", response.text[:200], "...")
-
-        data = response.json()
-        bus_stops = data.get("value", [])
-
-        if not bus_stops:
-            print("No bus stops returned. Your API key may not be subscribed to the BusStops dataset.")
-        else:
-            print(f"Retrieved {len(bus_stops)} bus stops successfully.")
-
-        return bus_stops
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-        
-def get_bus_arrivals(busStopCode:int):
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-    
-    if not busStopCode: raise ValueError("busStopCode is required")
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/v3/BusArrival"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-    params = {"BusStopCode": busStopCode}
-
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        bus_arrivals = data.get("value", [])
-        if not bus_arrivals: print("No bus arrivals returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(bus_arrivals)} bus stops successfully.")
-        return bus_arrivals
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_bus_services():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/BusServices"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        bus_services = data.get("value", [])
-        if not bus_services: print("No bus services returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(bus_services)} bus stops successfully.")
-        return bus_services
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_bus_routes():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/BusRoutes"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        bus_routes = data.get("value", [])
-        if not bus_routes: print("No bus routes returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(bus_routes)} bus stops successfully.")
-        return bus_routes
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_station_crowd_density_realtime(train_line:str):
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-    
-    if not train_line: raise ValueError("train_line is required")
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/PCDRealTime"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-    params = {"TrainLine": train_line}
-
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        station_crowd_density = data.get("value", [])
-        if not station_crowd_density: print("No data returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(station_crowd_density)} bus stops successfully.")
-        return station_crowd_density
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_station_crowd_density_forecast(train_line:str):
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-    
-    if not train_line: raise ValueError("train_line is required")
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/PCDForecast"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-    params = {"TrainLine": train_line}
-
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        station_crowd_density_forecast = data.get("value", [])
-        if not station_crowd_density_forecast: print("No data returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(station_crowd_density_forecast)} bus stops successfully.")
-        return station_crowd_density_forecast
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_taxi_availability():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/Taxi-Availability"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        taxi_availability = data.get("value", [])
-        if not taxi_availability: print("No taxies returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(taxi_availability)} bus stops successfully.")
-        return taxi_availability
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_taxi_stands():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/TaxiStands"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        taxi_stands = data.get("value", [])
-        if not taxi_stands: print("No taxi stands returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(taxi_stands)} bus stops successfully.")
-        return taxi_stands
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_train_service_alerts():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/TrainServiceAlerts"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        train_service_alerts = data.get("value", [])
-        if not train_service_alerts: print("No alerts returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(train_service_alerts)} bus stops successfully.")
-        return train_service_alerts
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_estimated_travel_times():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
+import httpx
 
-    url = "https://datamall2.mytransport.sg/ltaodataservice/EstTravelTimes"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        travel_times = data.get("value", [])
-        if not travel_times: print("No travel times returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(travel_times)} bus stops successfully.")
-        return travel_times
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_traffic_images():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/Traffic-Imagesv2"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        traffic_images = data.get("value", [])
-        if not traffic_images: print("No traffic images returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(traffic_images)} bus stops successfully.")
-        return traffic_images
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-    
-def get_traffic_incidents():
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/TrafficIncidents"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
-    }
+from app.services.quota import BULK, INTERACTIVE, REALTIME
 
+DATAMALL_API_KEY = os.getenv("DATAMALL_API_KEY")
+DATAMALL_BASE_URL = os.getenv("DATAMALL_BASE_URL", "https://datamall2.mytransport.sg/ltaodataservice")
+
+# Connection pool / timeout settings, overridable from the .env file.
+DATAMALL_TIMEOUT = float(os.getenv("DATAMALL_TIMEOUT", "10"))
+DATAMALL_CONNECT_TIMEOUT = float(os.getenv("DATAMALL_CONNECT_TIMEOUT", "5"))
+DATAMALL_MAX_CONNECTIONS = int(os.getenv("DATAMALL_MAX_CONNECTIONS", "100"))
+DATAMALL_MAX_KEEPALIVE = int(os.getenv("DATAMALL_MAX_KEEPALIVE", "20"))
+DATAMALL_KEEPALIVE_EXPIRY = float(os.getenv("DATAMALL_KEEPALIVE_EXPIRY", "60"))
+DATAMALL_HTTP2 = os.getenv("DATAMALL_HTTP2", "1").lower() not in ("0", "false", "no")
+
+# DataMall returns at most PAGE_SIZE records per call; the rest are read with $skip.
+DATAMALL_PAGE_SIZE = 500
+DATAMALL_PAGE_CONCURRENCY = int(os.getenv("DATAMALL_PAGE_CONCURRENCY", "8"))
+DATAMALL_MAX_PAGES = int(os.getenv("DATAMALL_MAX_PAGES", "200"))
+# Upstream calls in flight for one batch request, e.g. arrivals for many stops.
+DATAMALL_BATCH_CONCURRENCY = int(os.getenv("DATAMALL_BATCH_CONCURRENCY", "10"))
+
+# Cache lifetimes: static datasets change at most daily, realtime ones follow
+# the refresh interval LTA publishes for them.
+STATIC_TTL = float(os.getenv("DATAMALL_STATIC_TTL", str(24 * 60 * 60)))
+DATAMALL_CACHE_SIZE = int(os.getenv("DATAMALL_CACHE_SIZE", "2048"))
+# How long past its TTL a cached result may still be served while it is being
+# refreshed, or while DataMall is down.
+DATAMALL_MAX_STALE = float(os.getenv("DATAMALL_MAX_STALE", str(60 * 60)))
+# Static datasets are still useful weeks old, e.g. from a snapshot during an outage.
+STATIC_MAX_STALE = float(os.getenv("DATAMALL_STATIC_MAX_STALE", str(30 * 24 * 60 * 60)))
+DATAMALL_BREAKER_FAILURES = int(os.getenv("DATAMALL_BREAKER_FAILURES", "5"))
+DATAMALL_BREAKER_RESET = float(os.getenv("DATAMALL_BREAKER_RESET", "30"))
+# Rate budget of the DataMall account (0 disables it), and how many calls of
+# each priority class may queue for it before new ones are shed. Each worker
+# enforces its share, so the budget is split over WEB_CONCURRENCY, which
+# uvicorn also reads as its default --workers.
+DATAMALL_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+DATAMALL_RATE_LIMIT = float(os.getenv("DATAMALL_RATE_LIMIT", "30")) / DATAMALL_WORKERS
+DATAMALL_RATE_BURST = float(os.getenv("DATAMALL_RATE_BURST", "60")) / DATAMALL_WORKERS
+DATAMALL_QUEUE_LIMITS = (
+    int(os.getenv("DATAMALL_QUEUE_INTERACTIVE", "200")),
+    int(os.getenv("DATAMALL_QUEUE_REALTIME", "100")),
+    int(os.getenv("DATAMALL_QUEUE_BULK", "50")),
+)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    path: str            # endpoint path under DATAMALL_BASE_URL
+    label: str           # human readable name used in log lines
+    param: str = None    # query parameter name for parameterised datasets
+    paginated: bool = False  # served in $skip pages of DATAMALL_PAGE_SIZE records
+    ttl: float = 60          # seconds a fetched result may be served from cache
+    max_stale: float = DATAMALL_MAX_STALE  # extra seconds it may be served while refreshing
+    snapshot: bool = False   # persisted to disk and restored on startup
+    records_key: str = "value"  # field of the response body holding the records
+    prefetch: bool = False   # kept warm by the background scheduler
+    priority: int = REALTIME  # rate budget class: INTERACTIVE, REALTIME or BULK
+    shared: bool = True      # one copy per host for all workers (see app.services.shared)
+
+
+# One entry per DataMall dataset we expose. The get_* functions in
+# app.services.datamall_async are thin wrappers that look their dataset up here.
+DATASETS = {
+    "BusStops": Dataset("BusStops", "bus stops", paginated=True, snapshot=True,
+                        ttl=STATIC_TTL, max_stale=STATIC_MAX_STALE, priority=BULK),
+    "BusArrival": Dataset("v3/BusArrival", "bus arrivals", param="BusStopCode", ttl=20,
+                          records_key="Services", priority=INTERACTIVE, shared=False),
+    "BusServices": Dataset("BusServices", "bus services", paginated=True, snapshot=True,
+                           ttl=STATIC_TTL, max_stale=STATIC_MAX_STALE, priority=BULK),
+    "BusRoutes": Dataset("BusRoutes", "bus routes", paginated=True, snapshot=True,
+                         ttl=STATIC_TTL, max_stale=STATIC_MAX_STALE, priority=BULK),
+    "PCDRealTime": Dataset("PCDRealTime", "station crowd density", param="TrainLine", ttl=10 * 60,
+                           prefetch=True),
+    "PCDForecast": Dataset("PCDForecast", "station crowd density forecast", param="TrainLine", ttl=60 * 60,
+                           prefetch=True),
+    "TaxiAvailability": Dataset("Taxi-Availability", "taxi locations", paginated=True, ttl=60,
+                                prefetch=True),
+    "TaxiStands": Dataset("TaxiStands", "taxi stands", snapshot=True,
+                          ttl=STATIC_TTL, max_stale=STATIC_MAX_STALE, priority=BULK),
+    "TrainServiceAlerts": Dataset("TrainServiceAlerts", "train service alerts", ttl=60, prefetch=True),
+    "EstTravelTimes": Dataset("EstTravelTimes", "travel times", ttl=5 * 60),
+    "TrafficImages": Dataset("Traffic-Imagesv2", "traffic images", ttl=60),
+    "TrafficIncidents": Dataset("TrafficIncidents", "traffic incidents", ttl=2 * 60, prefetch=True),
+    "GeospatialWholeIsland": Dataset("GeospatialWholeIsland", "geospatial layers", param="ID",
+                                     ttl=STATIC_TTL, max_stale=STATIC_MAX_STALE, priority=BULK),
+}
+
+
+# Background prefetching: set DATAMALL_PREFETCH=0 to turn it off, e.g. in development.
+DATAMALL_PREFETCH = os.getenv("DATAMALL_PREFETCH", "1").lower() not in ("0", "false", "no")
+
+# Lines accepted by the PCDRealTime / PCDForecast TrainLine parameter.
+TRAIN_LINES = ("CCL", "CEL", "CGL", "DTL", "EWL", "NEL", "NSL", "BPL", "SLRT", "PLRT", "TEL")
+
+
+def _http2_available():
+    if not DATAMALL_HTTP2:
+        return False
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        traffic_incidents = data.get("value", [])
-        if not traffic_incidents: print("No traffic incidents returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(traffic_incidents)} bus stops successfully.")
-        return traffic_incidents
-
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
-
-def get_geospacial_whole_island(id:int):
-    if not DATAMALL_API_KEY:
-        print("API key not found. Please set it in your .env file.")
-        return []
-    
-    if not id: raise ValueError("id is required")
-
-    url = "https://datamall2.mytransport.sg/ltaodataservice/GeospatialWholeIsland"
-    headers = {
-        "AccountKey": DATAMALL_API_KEY,
-        "accept": "application/json"
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def client_options():
+    """Keyword arguments for the DataMall HTTP client."""
+    return {
+        "base_url": DATAMALL_BASE_URL.rstrip("/") + "/",
+        "headers": {"AccountKey": DATAMALL_API_KEY or "", "accept": "application/json"},
+        "timeout": httpx.Timeout(DATAMALL_TIMEOUT, connect=DATAMALL_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=DATAMALL_MAX_CONNECTIONS,
+            max_keepalive_connections=DATAMALL_MAX_KEEPALIVE,
+            keepalive_expiry=DATAMALL_KEEPALIVE_EXPIRY,
+        ),
+        "http2": _http2_available(),
     }
-    params = {"ID": id}
-
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        bus_arrivals = data.get("value", [])
-        if not bus_arrivals: print("No geospatial data returned. Your API key may not be subscribed to the dataset.")
-        else: print(f"Retrieved {len(bus_arrivals)} returned successfully.")
-        return bus_arrivals
 
-    except requests.exceptions.RequestException as e:
-        print("LTA API request failed:", e)
-        return []
 
-# Example usage
-if __name__ == "__main__":
-    stops = get_bus_stops()
-    print(f"\nTotal bus stops retrieved: {len(stops)}")
+def request_params(dataset: Dataset, value=None):
+    if dataset.param is None:
+        return None
+    if not value:
+        raise ValueError(f"{dataset.param} is required")
+    return {dataset.param: value}
@@ -0,0 +1,432 @@
+"""DataMall fetchers used by the API routes.
+
+Looks datasets up in the app.services.datamall table and runs on a single
+httpx.AsyncClient, so an in-flight DataMall call only parks a coroutine
+instead of holding a threadpool thread.
+"""
+import asyncio
+import hashlib
+from contextvars import ContextVar
+
+import httpx
+
+from app.services import datamall
+from app.services.cache import Aged, TTLCache
+from app.services.datamall import (
+    DATASETS, DATAMALL_BATCH_CONCURRENCY, DATAMALL_BREAKER_FAILURES, DATAMALL_BREAKER_RESET,
+    DATAMALL_CACHE_SIZE, DATAMALL_MAX_PAGES, DATAMALL_PAGE_CONCURRENCY, DATAMALL_PAGE_SIZE,
+    DATAMALL_QUEUE_LIMITS, DATAMALL_RATE_BURST, DATAMALL_RATE_LIMIT, TRAIN_LINES, Dataset,
+    client_options, request_params,
+)
+from app.services.metrics import dataset_cache_lookups, datamall_bytes, datamall_request_seconds, datamall_requests
+from app.services.quota import QuotaScheduler
+from app.services.resilience import CircuitBreaker, CircuitOpenError
+from app.services.shared import SHARED_CACHE, SharedStore
+from app.services.snapshots import SnapshotStore
+
+_client = None
+
+DATASET_NAMES = {dataset: name for name, dataset in DATASETS.items()}
+
+# Keyed by (dataset name, parameter value), e.g. ("BusArrival", "83139").
+dataset_cache = TTLCache(maxsize=DATAMALL_CACHE_SIZE)
+
+breakers = {
+    name: CircuitBreaker(name, DATAMALL_BREAKER_FAILURES, DATAMALL_BREAKER_RESET)
+    for name in DATASETS
+}
+
+# Age in seconds of the data returned by the last get_dataset() call in the
+# current request, or None if nothing was served. Routes copy it into the
+# X-Data-Age response header.
+data_age: ContextVar = ContextVar("data_age", default=None)
+
+_refreshes = set()
+
+# Every page request waits here for the account's rate budget, by the
+# dataset's priority class.
+quota = QuotaScheduler(DATAMALL_RATE_LIMIT, DATAMALL_RATE_BURST, DATAMALL_QUEUE_LIMITS)
+
+# Callables run as listener(name, value, records) after every successful
+# download, e.g. to push changes to stream subscribers.
+dataset_listeners = []
+_snapshot_store = None
+_shared_store = None
+
+# A worker that is not the refresher keeps serving a shared copy of a dataset
+# the refresher keeps warm until it is this many TTLs old, then fetches itself.
+SHARED_GRACE = 2
+
+
+def get_snapshot_store() -> SnapshotStore:
+    global _snapshot_store
+    if _snapshot_store is None:
+        _snapshot_store = SnapshotStore()
+    return _snapshot_store
+
+
+def shared_origin() -> str:
+    """Identifies where shared copies come from: base URL and account key."""
+    source = f"{datamall.DATAMALL_BASE_URL}\n{datamall.DATAMALL_API_KEY or ''}"
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+def get_shared_store():
+    """Host wide store shared with the other workers, None when disabled."""
+    global _shared_store
+    if _shared_store is None and SHARED_CACHE:
+        _shared_store = SharedStore(origin=shared_origin())
+    return _shared_store
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Process wide keep-alive async client, created on first use."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(**client_options())
+    return _client
+
+
+async def close_async_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_page(dataset: Dataset, params=None, skip=0):
+    if skip:
+        params = {**(params or {}), "$skip": skip}
+    name = DATASET_NAMES.get(dataset, dataset.path)
+    await quota.acquire(dataset.priority)
+    try:
+        with datamall_request_seconds.time(name):
+            response = await get_async_client().get(dataset.path, params=params)
+        response.raise_for_status()
+        body = _json_body(response)
+    except httpx.HTTPError:
+        datamall_requests.inc(name, "error")
+        raise
+    datamall_requests.inc(name, "ok")
+    datamall_bytes.inc(name, amount=len(response.content))
+    return body.get(dataset.records_key, [])
+
+
+def _json_body(response: httpx.Response) -> dict:
+    # a 200 carrying e.g. an HTML maintenance page is an upstream failure like a 5xx
+    try:
+        body = response.json()
+    except ValueError as e:
+        raise httpx.DecodingError(f"DataMall sent an invalid body: {e}", request=response.request)
+    if not isinstance(body, dict):
+        raise httpx.DecodingError("DataMall sent an unexpected body", request=response.request)
+    return body
+
+
+async def iter_pages(name: str, value=None, concurrency: int = DATAMALL_PAGE_CONCURRENCY):
+    """Yield a dataset page by page, in order. A dataset whose value is one
+    object rather than a list of records is yielded as that object.
+
+    DataMall does not report a total, so after a full first page we keep up to
+    `concurrency` $skip requests in flight ahead of the page being yielded and
+    stop at the first short page, cancelling whatever was fetched past it.
+    """
+    dataset = DATASETS[name]
+    params = request_params(dataset, value)
+
+    first = await fetch_page(dataset, params)
+    if first:
+        yield first
+    # a single object (TrainServiceAlerts) or a short page is the whole dataset
+    if not isinstance(first, list) or not dataset.paginated or len(first) < DATAMALL_PAGE_SIZE:
+        return
+
+    pending = {}
+    scheduled = current = 1
+    try:
+        while current < DATAMALL_MAX_PAGES:
+            while scheduled < min(current + max(concurrency, 1), DATAMALL_MAX_PAGES):
+                skip = scheduled * DATAMALL_PAGE_SIZE
+                pending[scheduled] = asyncio.create_task(fetch_page(dataset, params, skip))
+                scheduled += 1
+            page = await pending.pop(current)
+            if page:
+                yield page
+            if len(page) < DATAMALL_PAGE_SIZE:
+                break
+            current += 1
+    finally:
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+
+
+async def iter_records(name: str, value=None):
+    """Stream a dataset record by record without holding every page at once."""
+    async for page in iter_pages(name, value):
+        if not isinstance(page, list):
+            yield page
+            continue
+        for record in page:
+            yield record
+
+
+async def load_dataset(name: str, value=None):
+    """Download a whole dataset, raising httpx.HTTPError on failure. A value
+    that is one object instead of a list is returned as is."""
+    dataset = DATASETS[name]
+    records = []
+    async for page in iter_pages(name, value):
+        if not isinstance(page, list):
+            return page
+        records.extend(page)
+    if not records: print(f"No {dataset.label} returned. Your API key may not be subscribed to the dataset.")
+    return records
+
+
+async def fetch_dataset(name: str, value=None):
+    """Uncached download; upstream errors are logged and give an empty list."""
+    if not datamall.DATAMALL_API_KEY:
+        print("API key not found. Please set it in your .env file.")
+        return []
+
+    try:
+        return await load_dataset(name, value)
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        print("LTA API request failed:", e)
+        return []
+
+
+async def _read_shared(name: str, value=None):
+    """The shared copy of a dataset if this worker should use it rather than
+    call DataMall, as Aged(records, age), else None.
+
+    Any worker takes a copy another worker published since its own was
+    loaded, as long as it is within TTL. Workers other than the refresher
+    also keep a copy the refresher looks after for up to SHARED_GRACE TTLs,
+    so they only go upstream themselves when the refresher has stalled.
+    """
+    dataset = DATASETS[name]
+    store = get_shared_store()
+    if store is None or not dataset.shared:
+        return None
+    table = store.read(name, value)
+    if table is None:
+        return None
+    records = await asyncio.to_thread(table.records)
+    current = dataset_cache.peek((name, value))
+    if (current is None or current.value is not records) and table.age < dataset.ttl:
+        return Aged(records, table.age)
+    kept_warm = datamall.DATAMALL_PREFETCH and (dataset.prefetch or dataset.snapshot)
+    if kept_warm and table.age < dataset.ttl * SHARED_GRACE and not store.is_refresher():
+        return Aged(records, table.age)
+    return None
+
+
+def _notify(name: str, value, records):
+    for listener in dataset_listeners:
+        listener(name, value, records)
+
+
+def _loader(name: str, value=None):
+    async def load():
+        dataset = DATASETS[name]
+        shared = await _read_shared(name, value)
+        if shared is not None:
+            current = dataset_cache.peek((name, value))
+            if current is None or current.value is not shared.value:
+                _notify(name, value, shared.value)
+            return shared
+
+        records = await breakers[name].call(load_dataset, name, value)
+        if dataset.snapshot and records:
+            await asyncio.to_thread(get_snapshot_store().save, name, records, value)
+        store = get_shared_store()
+        # the shared files hold lists of records; a single object stays per worker
+        if store is not None and dataset.shared and isinstance(records, list) and records:
+            await asyncio.to_thread(store.publish, name, records, value)
+        _notify(name, value, records)
+        return records
+    return load
+
+
+def _refresh(name: str, value=None):
+    """Reload a cached dataset without making the caller wait for it."""
+    dataset = DATASETS[name]
+
+    async def run():
+        try:
+            await dataset_cache.load((name, value), _loader(name, value), dataset.ttl)
+        except CircuitOpenError:
+            pass
+        except httpx.HTTPError as e:
+            print("LTA API refresh failed:", e)
+        except Exception as e:
+            # nobody awaits this task, so log here instead of "exception was never retrieved"
+            print(f"Refresh of {dataset.label} failed unexpectedly: {e!r}")
+
+    task = asyncio.create_task(run())
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
+
+
+async def get_dataset(name: str, value=None):
+    """Cached download using the dataset's TTL.
+
+    Fresh entries are returned as is. Expired entries less than the dataset's
+    max_stale past their TTL are returned immediately while a refresh runs in
+    the background. Only a cold miss waits for DataMall, and all
+    concurrent misses share that one call. Calls go through the dataset's
+    circuit breaker, so an outage fails fast instead of queueing on timeouts.
+    """
+    dataset = DATASETS[name]
+    data_age.set(None)
+    if not datamall.DATAMALL_API_KEY:
+        print("API key not found. Please set it in your .env file.")
+        return []
+    request_params(dataset, value)  # validate before touching the cache
+
+    key = (name, value)
+    entry = dataset_cache.peek(key)
+    if entry is not None and entry.fresh:
+        dataset_cache_lookups.inc(name, "hit")
+    elif entry is not None and entry.age < dataset.ttl + dataset.max_stale:
+        dataset_cache_lookups.inc(name, "stale")
+        if not dataset_cache.loading(key):
+            _refresh(name, value)
+    else:
+        try:
+            entry = await dataset_cache.load(key, _loader(name, value), dataset.ttl)
+        except (httpx.HTTPError, CircuitOpenError) as e:
+            dataset_cache_lookups.inc(name, "error")
+            print("LTA API request failed:", e)
+            return []
+        dataset_cache_lookups.inc(name, "miss")
+
+    data_age.set(entry.age)
+    return entry.value
+
+
+def warm_start():
+    """Seed the cache from the workers' shared store, or else from on-disk
+    snapshots, so the first requests are served without waiting for DataMall.
+    Copies past their TTL are loaded as stale entries and get refreshed by
+    the prefetch scheduler or on first use; copies more than max_stale past
+    their TTL are left out. Listeners are told about seeded datasets too, so
+    stream subscribers start from the same data."""
+    store = get_snapshot_store()
+    shared = get_shared_store()
+    for name, dataset in DATASETS.items():
+        if dataset.param is not None:
+            continue
+        usable = dataset.ttl + dataset.max_stale
+        # another worker's copy is at least as new as the snapshot it wrote
+        table = shared.read(name) if shared is not None and dataset.shared else None
+        if table is not None and table.age < usable:
+            dataset_cache.set((name, None), table.records(), dataset.ttl, age=table.age)
+            _notify(name, None, table.records())
+            continue
+        if not dataset.snapshot:
+            continue
+        snapshot = store.load(name)
+        if snapshot is not None and snapshot.age < usable:
+            dataset_cache.set((name, None), snapshot.records, dataset.ttl, age=snapshot.age)
+            _notify(name, None, snapshot.records)
+            print(f"Loaded {len(snapshot.records)} {dataset.label} from snapshot {snapshot.version}.")
+
+
+async def refresh_dataset(name: str, value=None):
+    """Reload one cached dataset now, joining a reload already in flight.
+    Raises httpx.HTTPError or CircuitOpenError if DataMall cannot be reached."""
+    return await dataset_cache.load((name, value), _loader(name, value), DATASETS[name].ttl)
+
+
+async def get_bus_stops():
+    return await get_dataset("BusStops")
+
+async def get_bus_arrivals(busStopCode:str):
+    return await get_dataset("BusArrival", busStopCode)
+
+async def get_bus_arrivals_batch(busStopCodes, concurrency: int = DATAMALL_BATCH_CONCURRENCY):
+    """Arrivals for many stops at once, at most `concurrency` upstream calls
+    in flight. Returns {code: (services, age_seconds)}; stops served from
+    cache cost nothing."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(code):
+        async with semaphore:
+            services = await get_bus_arrivals(code)
+            return code, (services, data_age.get())
+
+    return dict(await asyncio.gather(*(one(code) for code in busStopCodes)))
+
+async def get_bus_services():
+    return await get_dataset("BusServices")
+
+async def get_bus_routes():
+    return await get_dataset("BusRoutes")
+
+async def get_station_crowd_density_realtime(train_line:str):
+    return await get_dataset("PCDRealTime", train_line)
+
+async def get_station_crowd_density_forecast(train_line:str):
+    return await get_dataset("PCDForecast", train_line)
+
+def _compact_crowd_records(records):
+    """PCDRealTime rows are already per station; PCDForecast nests stations
+    under each date, so flatten those to one row per station and date."""
+    stations = []
+    for r in records:
+        if "Stations" not in r:
+            stations.append({k: r.get(k) for k in ("Station", "StartTime", "EndTime", "CrowdLevel")})
+            continue
+        for station in r.get("Stations") or []:
+            stations.append({
+                "Station": station.get("Station"),
+                "Date": r.get("Date"),
+                "Intervals": [
+                    {"Start": i.get("Start"), "CrowdLevel": i.get("CrowdLevel")}
+                    for i in station.get("Interval") or []
+                ],
+            })
+    return stations
+
+async def get_station_crowd_density_all_lines(forecast: bool = False):
+    """Crowd density for every train line, fetched concurrently and cached
+    per line. One failing line is reported in its entry instead of failing
+    the whole response."""
+    fetch = get_station_crowd_density_forecast if forecast else get_station_crowd_density_realtime
+
+    async def one(line):
+        try:
+            records = await fetch(line)
+        except Exception as e:
+            return {"line": line, "stations": [], "count": 0, "age": None, "error": str(e)}
+        stations = _compact_crowd_records(records)
+        age = data_age.get()
+        if age is None:  # nothing cached and DataMall did not answer
+            return {"line": line, "stations": [], "count": 0, "age": None, "error": "Data unavailable"}
+        return {"line": line, "stations": stations, "count": len(stations), "age": int(age), "error": None}
+
+    return await asyncio.gather(*(one(line) for line in TRAIN_LINES))
+
+async def get_taxi_availability():
+    return await get_dataset("TaxiAvailability")
+
+async def get_taxi_stands():
+    return await get_dataset("TaxiStands")
+
+async def get_train_service_alerts():
+    return await get_dataset("TrainServiceAlerts")
+
+async def get_estimated_travel_times():
+    return await get_dataset("EstTravelTimes")
+
+async def get_traffic_images():
+    return await get_dataset("TrafficImages")
+
+async def get_traffic_incidents():
+    return await get_dataset("TrafficIncidents")
+
+async def get_geospacial_whole_island(id:str):
+    return await get_dataset("GeospatialWholeIsland", id)
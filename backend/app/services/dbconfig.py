@@ -1,8 +1,10 @@
-import os,jwt
+import os,jwt,json,base64
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import create_client, Client, AsyncClient
 from uuid import UUID
-from fastapi import Header, HTTPException,Depends
+from fastapi import Header, HTTPException,Depends,status
+from app.services.auth import TokenVerifier, InvalidToken
+from app.services.metrics import instrument_httpx
 
 # Supabase API Key and URL will be in the telegram.
 # Add environment variable "SUPABASE_URL" and "SUPBASE_KEY" with value of the API key to your device.
@@ -12,33 +14,59 @@ load_dotenv()
 url=os.getenv("SUPABASE_URL")
 key=os.getenv("SUPABASE_KEY")
 svc_key = os.environ["SUPABASE_SVC_KEY"]
-supabase: Client=create_client(url,key)
-admin: Client=create_client(url,svc_key)
+# Async clients: each keeps one pooled HTTP client for the life of the app, so
+# PostgREST calls from async routes no longer block the event loop.
+supabase: AsyncClient=AsyncClient(url,key)
+admin: AsyncClient=AsyncClient(url,svc_key)
 
+for client in (supabase, admin):
+    instrument_httpx(client.postgrest.session)
+
+# Sync client for the auth dependency, which runs in the threadpool
 sb: Client = create_client(url,key)
 
 
+async def close_db_clients():
+    for client in (supabase, admin):
+        if client._postgrest is not None:
+            await client.postgrest.aclose()
+
+
+def remote_user_id(token: str):
+    # Supabase verifies and returns the user; only used when we cannot verify locally
+    return sb.auth.get_user(token).user.id
+
+# Settings > API > JWT Secret of the Supabase project, for HS256 signed tokens.
+# Projects using asymmetric signing keys are verified against their JWKS instead.
+tokens = TokenVerifier(url, os.getenv("SUPABASE_JWT_SECRET"), remote_user_id)
+
+
 def get_current_user_uuid(authorization: str = Header(...)) -> UUID:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
     token = authorization.split(" ", 1)[1]
     try:
-        resp = sb.auth.get_user(token)  # Supabase verifies and returns the user
-        uid = resp.user.id
-        return UUID(uid)
-    except Exception:
+        return tokens.verify(token)
+    except (InvalidToken, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     
-def get_specific_user(user_id:UUID ):
-    resp = supabase.table("users").select("*").eq("uid",user_id).single().execute()
-    print(resp.data)
+async def require_admin(user_uuid: UUID = Depends(get_current_user_uuid)) -> UUID:
+    # Admins are users rows with user_type 'admin' (as the admin pages check);
+    # read with the service client so row level security cannot hide the row
+    resp = await admin.table("users").select("user_type").eq("uid", str(user_uuid)).limit(1).execute()
+    if not resp.data or resp.data[0].get("user_type") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user_uuid
+
+async def get_specific_user(user_id:UUID ):
+    resp = await supabase.table("users").select("*").eq("uid",user_id).single().execute()
     return resp
 
-def list_feedbacks():
+async def list_feedbacks():
     try:
         sel = "id,created_at,title,description,type,rating,user:users(username)"
         #            ^ alias     ^ inferred relation to users via feedback.user_id
-        resp = supabase.table("feedback").select(sel).order("created_at", desc=True).execute()
+        resp = await supabase.table("feedback").select(sel).order("created_at", desc=True).execute()
         rows = resp.data or []
         for r in rows:
             r["username"] = (r.get("user") or {}).get("username")
@@ -47,47 +75,154 @@ def list_feedbacks():
     except Exception as e:
         print("Error listing feedbacks:", str(e))
         raise e
-def delete_feedback(feedback_id: int):
+def encode_feedback_cursor(row) -> str:
+    key = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_feedback_cursor(cursor: str):
+    try:
+        created_at, fid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), int(fid)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def search_pattern(search: str) -> str:
+    # PostgREST ilike pattern. The term is escaped twice: \, % and _ for LIKE
+    # (so "50%" or "a_b" match literally), then \ and " for PostgREST's double
+    # quoted value, which keeps commas and parentheses in the term literal.
+    term = search.strip().replace("*", "")
+    term = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    term = term.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"*{term}*"'
+
+async def list_feedbacks_page(limit: int = 50, cursor: str = None, type: str = None, rating: int = None,
+                        since: str = None, until: str = None, search: str = None):
+    """
+    One page of feedback, newest first, with the author's username.
+    Keyset pagination on (created_at, id): the cursor is the last row seen,
+    so every page is an index range scan however deep the admin scrolls.
+    search matches title or description case-insensitively.
+    Returns (rows, next_cursor), next_cursor is None on the last page.
+    """
+    sel = "id,created_at,title,description,type,rating,user:users(username)"
+    query = supabase.table("feedback").select(sel)
+    if type:
+        query = query.eq("type", type)
+    if rating is not None:
+        query = query.eq("rating", rating)
+    if since:
+        query = query.gte("created_at", since)
+    if until:
+        query = query.lt("created_at", until)
+    conditions = []     # "or" groups, sent as one logic tree
+    if search and search.strip():
+        pattern = search_pattern(search)
+        conditions.append(f"or(title.ilike.{pattern},description.ilike.{pattern})")
+    if cursor:
+        created_at, fid = decode_feedback_cursor(cursor)
+        conditions.append(f'or(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{fid}))')
+    if conditions:
+        query = query.or_(f"and({','.join(conditions)})")
+    resp = await query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute()
+
+    rows = resp.data or []
+    next_cursor = encode_feedback_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    for r in rows:
+        r["username"] = (r.get("user") or {}).get("username")
+        r.pop("user", None)
+    return rows, next_cursor
+
+EXPORT_CHUNK_SIZE = 1000
+
+async def iter_table(table: str, sel: str, key: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yield a whole table as lists of at most chunk_size rows, ordered by key.
+    Each chunk is a keyset query (key > last key seen), so memory stays at one
+    chunk and later chunks are as cheap as the first.
+    """
+    last = None
+    while True:
+        query = supabase.table(table).select(sel).order(key).limit(chunk_size)
+        if last is not None:
+            query = query.gt(key, last)
+        resp = await query.execute()
+        rows = resp.data or []
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][key]
+
+async def iter_users(chunk_size: int = EXPORT_CHUNK_SIZE):
+    async for rows in iter_table("users", "uid,username,email", "uid", chunk_size):
+        yield rows
+
+async def iter_feedbacks(chunk_size: int = EXPORT_CHUNK_SIZE):
+    sel = "id,created_at,title,description,type,rating,user_id,user:users(username)"
+    async for rows in iter_table("feedback", sel, "id", chunk_size):
+        for r in rows:
+            r["username"] = (r.get("user") or {}).get("username")
+            r.pop("user", None)
+        yield rows
+
+async def delete_feedback(feedback_id: int):
     try:
-        resp = supabase.table("feedback").delete().eq("id", feedback_id).execute()
+        resp = await supabase.table("feedback").delete().eq("id", feedback_id).execute()
     except Exception as e:
         print("Error deleting feedback:", str(e))
         raise e
     return resp
 
-def list_replies(feedback_id: int):
+async def list_replies(feedback_id: int):
     """
     Return replies for a feedback with author username and timestamp.
     Shape: [{id, content, created_at, author}]
     """
     # Let PostgREST infer the FK replies.user_id -> users.id
     sel = "id, content, created_at, user_id, user:users!replies_user_id_fkey(username)"
-    resp = supabase.table("replies") \
+    resp = await supabase.table("replies") \
         .select(sel) \
         .eq("feedback_id", feedback_id) \
         .order("created_at", desc=False) \
         .execute()
-    
-    print(resp.data)
 
     rows = resp.data or []
     # Flatten: user.username -> author
     for r in rows:
         r["author"] = (r.get("user") or {}).get("username") or "Unknown"
         r.pop("user", None)
-        print(r)
     return rows
 
-def delete_reply(reply_id: int):
+async def list_replies_batch(feedback_ids):
+    """
+    Replies for many feedbacks in one query.
+    Shape: {feedback_id: [{id, content, created_at, user_id, author}]}, every id present.
+    """
+    sel = "id, feedback_id, content, created_at, user_id, user:users!replies_user_id_fkey(username)"
+    resp = await supabase.table("replies") \
+        .select(sel) \
+        .in_("feedback_id", list(feedback_ids)) \
+        .order("created_at", desc=False) \
+        .execute()
+
+    grouped = {fid: [] for fid in feedback_ids}
+    for r in resp.data or []:
+        r["author"] = (r.get("user") or {}).get("username") or "Unknown"
+        r.pop("user", None)
+        grouped.setdefault(r.pop("feedback_id"), []).append(r)
+    return grouped
+
+async def delete_reply(reply_id: int):
     try:
-        resp = supabase.table("replies").delete().eq("id", reply_id).execute()
+        resp = await supabase.table("replies").delete().eq("id", reply_id).execute()
     except Exception as e:
         print("Error deleting reply:", str(e))
         raise e
     return resp
 
-def delete_account(uid: UUID = Depends(get_current_user_uuid)):
+async def delete_account(uid: UUID = Depends(get_current_user_uuid)):
     try:
-        admin.auth.admin.delete_user(str(uid))   # deletes from auth.users
+        await admin.auth.admin.delete_user(str(uid))   # deletes from auth.users
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {e}")
\ No newline at end of file
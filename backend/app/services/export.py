@@ -0,0 +1,36 @@
+"""Incremental NDJSON / CSV encoding of row chunks for streaming downloads."""
+import csv
+import io
+
+import orjson
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def ndjson_lines(chunks):
+    async for rows in chunks:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+async def csv_lines(chunks, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # header only when the table is empty
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_rows(chunks, format: str, fields):
+    """Byte stream of the chunks in the given export format."""
+    if format == "csv":
+        return csv_lines(chunks, fields)
+    return ndjson_lines(chunks)
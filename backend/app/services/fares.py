@@ -0,0 +1,136 @@
+"""Bus fare engine over the BusRoutes distance tables.
+
+For every (ServiceNo, Direction) we keep the cumulative Distance along the
+route, so the distance between any board/alight pair is one subtraction.
+Singapore distance fares charge a journey with transfers on its total
+distance, so legs are summed per journey and all journeys of a batch are
+priced together with one vectorised band lookup.
+"""
+import threading
+
+import numpy as np
+
+# Indicative card fares in cents for basic bus services, by distance band.
+# FARE_BANDS_KM[i] is the upper bound (inclusive) of band i; journeys longer
+# than the last bound pay the last fare. Revise here when fares change.
+FARE_BANDS_KM = np.array([
+    3.2, 4.2, 5.2, 6.2, 7.2, 8.2, 9.2, 10.2, 11.2, 12.2, 13.2, 14.2, 15.2, 16.2,
+    17.2, 18.2, 19.2, 20.2, 21.2, 22.2, 23.2, 24.2, 25.2, 26.2, 27.2, 28.2, 29.2,
+    30.2, 31.2, 32.2, 33.2, 34.2, 35.2, 36.2, 37.2, 38.2, 39.2, 40.2,
+])
+FARES_CENTS = {
+    "adult": np.array([
+        119, 129, 140, 150, 159, 166, 173, 177, 181, 185, 189, 193, 197, 201,
+        205, 209, 212, 215, 218, 220, 221, 222, 223, 224, 225, 226, 227,
+        228, 229, 230, 231, 232, 233, 234, 235, 236, 237, 238, 239,
+    ]),
+    "student": np.array([
+        52, 57, 62, 67, 72, 76, 80, 82, 84, 86, 88, 90, 92, 94,
+        96, 97, 97, 97, 97, 97, 97, 97, 97, 97, 97, 97, 97,
+        97, 97, 97, 97, 97, 97, 97, 97, 97, 97, 97, 97,
+    ]),
+    "senior": np.array([
+        75, 80, 85, 90, 95, 99, 103, 105, 107, 109, 110, 110, 110, 110,
+        110, 110, 110, 110, 110, 110, 110, 110, 110, 110, 110, 110, 110,
+        110, 110, 110, 110, 110, 110, 110, 110, 110, 110, 110, 110,
+    ]),
+}
+FARE_TYPES = tuple(FARES_CENTS)
+FARE_TABLE = np.stack([FARES_CENTS[t] for t in FARE_TYPES])
+
+
+def fares_for(distances_km, fare_types) -> np.ndarray:
+    """Fare in cents for each journey distance, looked up band-wise in one pass."""
+    distances = np.round(np.asarray(distances_km, dtype=float), 1)
+    bands = np.searchsorted(FARE_BANDS_KM, distances, side="left")
+    rows = np.array([FARE_TYPES.index(t) for t in fare_types], dtype=int)
+    return FARE_TABLE[rows, bands]
+
+
+class FareEngine:
+    def __init__(self, bus_routes):
+        self.source = bus_routes
+        rows_by_route = {}
+        for r in bus_routes:
+            rows_by_route.setdefault((str(r.get("ServiceNo")), int(r.get("Direction") or 1)), []).append(r)
+
+        # (service, direction) -> (cumulative km per position, stop -> [positions])
+        self.tables = {}
+        self.directions = {}
+        for (service, direction), rows in rows_by_route.items():
+            rows.sort(key=lambda r: r.get("StopSequence") or 0)
+            km, positions, last = [], {}, 0.0
+            for pos, r in enumerate(rows):
+                last = float(r["Distance"]) if r.get("Distance") is not None else last
+                km.append(last)
+                positions.setdefault(r.get("BusStopCode"), []).append(pos)
+            self.tables[(service, direction)] = (km, positions)
+            self.directions.setdefault(service, []).append(direction)
+
+    def leg_distance(self, service: str, board: str, alight: str, direction: int = None) -> float:
+        """Distance in km riding `service` from `board` to `alight`."""
+        service = str(service)
+        directions = [direction] if direction else self.directions.get(service, [])
+        for d in directions:
+            table = self.tables.get((service, d))
+            if table is None:
+                continue
+            km, positions = table
+            starts, ends = positions.get(board), positions.get(alight)
+            if not starts or not ends:
+                continue
+            start = starts[0]
+            end = next((pos for pos in ends if pos > start), None)
+            if end is not None:
+                return km[end] - km[start]
+        raise KeyError(f"Service {service} does not run from {board} to {alight}")
+
+    def price(self, journeys, default_fare_type: str = "adult"):
+        """Price a batch of journeys.
+
+        Each journey is {"legs": [{"ServiceNo", "from", "to", "Direction"?}],
+        "fare_type"?}. Returns one result dict per journey, in order.
+        """
+        results, distances, fare_types, priced = [], [], [], []
+        for journey in journeys:
+            fare_type = journey.get("fare_type") or default_fare_type
+            if fare_type not in FARES_CENTS:
+                results.append({"error": f"Unknown fare type {fare_type}"})
+                continue
+            try:
+                legs = [
+                    round(self.leg_distance(leg["ServiceNo"], leg["from"], leg["to"], leg.get("Direction")), 1)
+                    for leg in journey["legs"]
+                ]
+            except KeyError as e:
+                results.append({"error": e.args[0]})
+                continue
+            results.append({"fare_type": fare_type, "legs_km": legs})
+            priced.append(len(results) - 1)
+            distances.append(sum(legs))
+            fare_types.append(fare_type)
+
+        if priced:
+            cents = fares_for(distances, fare_types)
+            for i, distance, fare in zip(priced, distances, cents):
+                results[i]["distance_km"] = round(distance, 1)
+                results[i]["fare"] = round(int(fare) / 100, 2)
+        return results
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def engine_for(bus_routes) -> FareEngine:
+    """Fare engine for the cached BusRoutes list, rebuilt when it changes.
+    Called from worker threads; requests arriving during a rebuild wait for
+    it instead of building their own copy."""
+    global _engine
+    engine = _engine
+    if engine is not None and engine.source is bus_routes:
+        return engine
+    with _engine_lock:
+        if _engine is None or _engine.source is not bus_routes:
+            _engine = FareEngine(bus_routes)
+        return _engine
@@ -0,0 +1,87 @@
+"""Taxi availability heatmap: points binned into web-mercator map tiles.
+
+A Taxi-Availability refresh is a few thousand coordinates. Binning is done
+with numpy for a whole zoom level at once and memoised per zoom until the
+cached records list is replaced, so a viewport query only filters the
+(much smaller) set of non-empty tiles.
+"""
+import numpy as np
+
+MIN_ZOOM, MAX_ZOOM = 8, 18
+EARTH_RADIUS_M = 6_371_000
+
+
+def tile_to_latlng(x, y, zoom):
+    """North-west corner of tile (x, y) at zoom, accepts arrays."""
+    n = 2.0 ** zoom
+    lng = np.asarray(x) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y) / n))))
+    return lat, lng
+
+
+def latlng_to_tile(lat, lng, zoom):
+    n = 2.0 ** zoom
+    lat_rad = np.radians(np.asarray(lat, dtype=float))
+    x = np.floor((np.asarray(lng, dtype=float) + 180.0) / 360.0 * n).astype(np.int64)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n).astype(np.int64)
+    return x, y
+
+
+class TaxiHeatmap:
+    def __init__(self, records):
+        self.source = records
+        coords = [
+            (float(r["Latitude"]), float(r["Longitude"]))
+            for r in records
+            if r.get("Latitude") and r.get("Longitude")
+        ]
+        points = np.array(coords, dtype=float).reshape(-1, 2)
+        self.lat, self.lng = points[:, 0], points[:, 1]
+        self._levels = {}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def level(self, zoom: int):
+        """(x, y, count) arrays of the non-empty tiles at zoom."""
+        if zoom not in self._levels:
+            x, y = latlng_to_tile(self.lat, self.lng, zoom)
+            keys, counts = np.unique(x * (1 << zoom) + y, return_counts=True)
+            self._levels[zoom] = (keys // (1 << zoom), keys % (1 << zoom), counts)
+        return self._levels[zoom]
+
+    def tiles(self, zoom: int, south=None, west=None, north=None, east=None):
+        """Tiles with their taxi counts, optionally limited to a bounding box."""
+        x, y, counts = self.level(zoom)
+        if None not in (south, west, north, east):
+            x0, y0 = latlng_to_tile(north, west, zoom)
+            x1, y1 = latlng_to_tile(south, east, zoom)
+            mask = (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+            x, y, counts = x[mask], y[mask], counts[mask]
+        # report the centre of each tile for plotting
+        lat, lng = tile_to_latlng(x + 0.5, y + 0.5, zoom)
+        return [
+            {"x": int(tx), "y": int(ty), "count": int(c), "Latitude": round(float(la), 6), "Longitude": round(float(ln), 6)}
+            for tx, ty, c, la, ln in zip(x, y, counts, lat, lng)
+        ]
+
+    def count_within(self, lats, lngs, radius_m: float):
+        """Taxis within radius_m of each of the given points (vectorised)."""
+        if not len(self.lat):
+            return np.zeros(len(lats), dtype=int)
+        lats = np.radians(np.asarray(lats, dtype=float))[:, None]
+        lngs = np.radians(np.asarray(lngs, dtype=float))[:, None]
+        dx = (np.radians(self.lng)[None, :] - lngs) * np.cos(lats)
+        dy = np.radians(self.lat)[None, :] - lats
+        return ((dx * dx + dy * dy) <= (radius_m / EARTH_RADIUS_M) ** 2).sum(axis=1)
+
+
+_heatmap = None
+
+
+def heatmap_for(records) -> TaxiHeatmap:
+    """Heatmap of the cached Taxi-Availability list, rebuilt each refresh cycle."""
+    global _heatmap
+    if _heatmap is None or _heatmap.source is not records:
+        _heatmap = TaxiHeatmap(records)
+    return _heatmap
@@ -0,0 +1,179 @@
+"""Process metrics in the Prometheus text exposition format.
+
+A deliberately small registry (counters, gauges and histograms with labels) instead
+of a client library: everything is recorded from the event loop, and /metrics
+renders it on demand. Values are per worker process: with several uvicorn
+workers each scrape is answered by whichever worker accepts the connection,
+so it shows that worker's counters, not a total for the host.
+"""
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}    # labels -> [bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _labels(self.label_names + ("le",), labels + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route template",
+    ("method", "route", "status"),
+)
+datamall_request_seconds = Histogram(
+    "datamall_request_duration_seconds", "DataMall page request latency", ("dataset",),
+)
+datamall_requests = Counter(
+    "datamall_requests_total", "DataMall page requests by outcome", ("dataset", "outcome"),
+)
+datamall_bytes = Counter(
+    "datamall_response_bytes_total", "Bytes received from DataMall", ("dataset",),
+)
+datamall_queue_wait_seconds = Histogram(
+    "datamall_queue_wait_seconds", "Time a DataMall call waited for the rate budget", ("priority",),
+)
+datamall_queue_depth = Gauge(
+    "datamall_queue_depth", "DataMall calls waiting for the rate budget", ("priority",),
+)
+datamall_shed = Counter(
+    "datamall_shed_total", "DataMall calls refused because their priority queue was full", ("priority",),
+)
+dataset_cache_lookups = Counter(
+    "dataset_cache_lookups_total", "Dataset cache lookups: hit, stale (served while refreshing), miss or error",
+    ("dataset", "result"),
+)
+supabase_request_seconds = Histogram(
+    "supabase_request_duration_seconds", "Supabase PostgREST request latency", ("table", "method", "status"),
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and records it under its route template
+    (/api/busarrivals/{busStopCode}, not the concrete path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(time.perf_counter() - start, scope["method"], path, str(status))
+
+
+async def _supabase_request_started(request):
+    request.extensions["started"] = time.perf_counter()
+
+
+async def _supabase_response(response):
+    await response.aread()
+    started = response.request.extensions.get("started")
+    if started is not None:
+        table = response.request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        supabase_request_seconds.observe(
+            time.perf_counter() - started, table, response.request.method, str(response.status_code)
+        )
+
+
+def instrument_httpx(client):
+    """Time every request made through an httpx.AsyncClient (the PostgREST session)."""
+    client.event_hooks["request"].append(_supabase_request_started)
+    client.event_hooks["response"].append(_supabase_response)
@@ -0,0 +1,123 @@
+"""Rate budget and priority queue in front of every DataMall call.
+
+DataMall limits calls per account key, so all upstream requests share one
+token bucket. The bucket lives in one process; with several workers each gets
+an equal share of the account's budget (see DATAMALL_WORKERS). When it is empty, callers queue by priority class and are
+released highest class first as tokens refill: arrivals for a user on the
+map go ahead of realtime polls, which go ahead of bulk static refreshes.
+Each class has a bounded queue; once it is full new calls are shed at once
+instead of waiting behind a backlog that would outlive their usefulness.
+"""
+import asyncio
+import time
+from collections import deque
+
+from app.services.metrics import datamall_queue_depth, datamall_queue_wait_seconds, datamall_shed
+from app.services.resilience import CircuitOpenError
+
+INTERACTIVE, REALTIME, BULK = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "realtime", "bulk")
+
+
+class QueueFullError(CircuitOpenError):
+    """Raised instead of queueing a call whose priority class is backed up.
+    A CircuitOpenError, so callers treat it like any other fail-fast refusal."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class QuotaScheduler:
+    """Hands out upstream call slots under a token bucket budget.
+
+    acquire() returns straight away while tokens are left and nobody of the
+    same or higher priority is waiting. Otherwise the caller joins its
+    class's queue, and a single dispatcher task releases waiters one token at
+    a time, always from the highest priority non-empty queue. A rate of 0
+    disables the budget.
+    """
+
+    def __init__(self, rate: float, burst: float, queue_limits):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.queue_limits = tuple(queue_limits)
+        self.queues = [deque() for _ in self.queue_limits]
+        self._dispatcher = None
+
+    def _waiting(self, priority: int) -> bool:
+        return any(self.queues[p] for p in range(priority + 1))
+
+    def _update_depth(self, priority: int):
+        datamall_queue_depth.set(len(self.queues[priority]), PRIORITY_NAMES[priority])
+
+    async def acquire(self, priority: int = REALTIME):
+        """Wait for a call slot, raising QueueFullError if the class is backed up."""
+        label = PRIORITY_NAMES[priority]
+        if self.bucket is None or (not self._waiting(priority) and self.bucket.try_take()):
+            datamall_queue_wait_seconds.observe(0.0, label)
+            return
+
+        queue = self.queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            datamall_shed.inc(label)
+            raise QueueFullError(f"DataMall {label} queue is full, retry later")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        self._update_depth(priority)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        start = time.perf_counter()
+        try:
+            await waiter
+        finally:
+            if waiter.cancelled():
+                # caller gone (e.g. client disconnected): stop counting it
+                # against the queue limit and the waiting check
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+                self._update_depth(priority)
+            datamall_queue_wait_seconds.observe(time.perf_counter() - start, label)
+
+    def _next_waiter(self):
+        for priority, queue in enumerate(self.queues):
+            while queue and queue[0].done():
+                queue.popleft()
+            self._update_depth(priority)
+            if queue:
+                return priority
+        return None
+
+    async def _dispatch(self):
+        while (priority := self._next_waiter()) is not None:
+            if not self.bucket.try_take():
+                await asyncio.sleep(self.bucket.wait_time())
+                continue
+            self.queues[priority].popleft().set_result(None)
+            self._update_depth(priority)
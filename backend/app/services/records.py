@@ -0,0 +1,147 @@
+"""Filtered, projected and cursor-paginated views of the bulk bus datasets.
+
+Each index keeps the records sorted by the dataset's natural key and, for
+every filterable field, the sorted positions of the records holding each
+value. A query intersects those position lists and starts after the cursor,
+so a page costs roughly its own size rather than a scan of the dataset.
+Cursors carry the last key rather than a position, so they stay valid when
+the dataset is refreshed underneath a client.
+"""
+import base64
+import heapq
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    key: tuple        # natural key, also the page order
+    filters: tuple    # fields that get a posting list
+
+
+INDEX_SPECS = {
+    "BusStops": IndexSpec(("BusStopCode",), ("BusStopCode", "RoadName")),
+    "BusServices": IndexSpec(("ServiceNo", "Direction"), ("ServiceNo", "Direction", "Operator", "Category")),
+    "BusRoutes": IndexSpec(("ServiceNo", "Direction", "StopSequence"),
+                           ("ServiceNo", "Direction", "BusStopCode", "Operator")),
+}
+
+
+def _key_part(value):
+    # ints sort as ints, everything else as text, so keys are always comparable
+    if isinstance(value, int) and not isinstance(value, bool):
+        return (0, value)
+    return (1, "" if value is None else str(value))
+
+
+def _normalise(value) -> str:
+    return "" if value is None else str(value).strip().casefold()
+
+
+def encode_cursor(key) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _is_key_part(part) -> bool:
+    # the shape _key_part produces: (0, int) or (1, str)
+    return len(part) == 2 and (
+        (part[0] == 0 and type(part[1]) is int) or (part[0] == 1 and type(part[1]) is str)
+    )
+
+
+def decode_cursor(cursor: str, size: int = None):
+    """Key from a cursor, rejecting anything encode_cursor could not have
+    produced (which would not compare against the index keys)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = tuple(tuple(part) for part in json.loads(base64.urlsafe_b64decode(padded)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (size is not None and len(key) != size) or not all(map(_is_key_part, key)):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def _contains(positions, pos) -> bool:
+    i = bisect_left(positions, pos)
+    return i < len(positions) and positions[i] == pos
+
+
+class RecordIndex:
+    def __init__(self, records, spec: IndexSpec):
+        self.source = records
+        self.spec = spec
+        keyed = sorted(((tuple(_key_part(r.get(f)) for f in spec.key), r) for r in records), key=lambda kr: kr[0])
+        self.keys = [k for k, _ in keyed]
+        self.records = [r for _, r in keyed]
+        self.fields = set().union(*(r.keys() for r in records))
+        self.postings = {field: {} for field in spec.filters}
+        for pos, r in enumerate(self.records):
+            for field in spec.filters:
+                self.postings[field].setdefault(_normalise(r.get(field)), []).append(pos)
+
+    def _matching(self, field, values):
+        """Sorted positions whose field equals any of the values."""
+        lists = [self.postings[field].get(_normalise(v), []) for v in values]
+        if len(lists) == 1:
+            return lists[0]
+        return list(dict.fromkeys(heapq.merge(*lists)))
+
+    def query(self, filters=None, fields=None, cursor=None, limit=DEFAULT_LIMIT):
+        """One page: (items, next_cursor); next_cursor is None on the last page.
+
+        filters maps a filterable field to a list of accepted values, fields
+        is the list of fields to return (all when None).
+        """
+        unknown = [f for f in (filters or {}) if f not in self.postings]
+        if unknown:
+            raise ValueError(f"Cannot filter on {', '.join(unknown)}")
+        if fields:
+            unknown = [f for f in fields if f not in self.fields]
+            if unknown:
+                raise ValueError(f"Unknown fields {', '.join(unknown)}")
+        start = bisect_right(self.keys, decode_cursor(cursor, len(self.spec.key))) if cursor else 0
+
+        page = []
+        if filters:
+            matches = sorted((self._matching(f, v) for f, v in filters.items()), key=len)
+            shortest, others = matches[0], matches[1:]
+            for pos in shortest[bisect_left(shortest, start):]:
+                if all(_contains(other, pos) for other in others):
+                    page.append(pos)
+                    if len(page) > limit:
+                        break
+        else:
+            page = list(range(start, min(start + limit + 1, len(self.records))))
+
+        more = len(page) > limit
+        page = page[:limit]
+        if fields:
+            items = [{f: self.records[pos].get(f) for f in fields} for pos in page]
+        else:
+            items = [self.records[pos] for pos in page]
+        next_cursor = encode_cursor(self.keys[page[-1]]) if more else None
+        return items, next_cursor
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def record_index_for(name: str, records) -> RecordIndex:
+    """Index for a bulk dataset, rebuilt only when the cached records list
+    changes. Called from worker threads; requests arriving during a rebuild
+    wait for it instead of building their own copy."""
+    index = _indexes.get(name)
+    if index is not None and index.source is records:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.source is not records:
+            index = _indexes[name] = RecordIndex(records, INDEX_SPECS[name])
+        return index
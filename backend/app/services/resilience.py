@@ -0,0 +1,80 @@
+"""Circuit breaker used to stop queueing calls behind a failing upstream."""
+import time
+
+import httpx
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+def is_upstream_failure(exc: Exception) -> bool:
+    """Transport errors, timeouts, undecodable bodies, 5xx and 429 count
+    against the breaker."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(exc, httpx.HTTPError)
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    allow() returns False for `reset_timeout` seconds. The first call after
+    that is let through as a trial; its outcome closes or re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def cancel_trial(self):
+        # let the next call be the trial instead of staying half-open forever
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, func, *args):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable, retry later")
+        try:
+            result = await func(*args)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            elif isinstance(e, CircuitOpenError):
+                self.cancel_trial()  # refused locally (e.g. shed), says nothing about the upstream
+            else:
+                self.record_success()  # upstream answered, e.g. a 4xx for bad input
+            raise
+        except BaseException:
+            self.cancel_trial()  # cancelled mid-call: free the trial slot for the next caller
+            raise
+        self.record_success()
+        return result
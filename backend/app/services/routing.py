@@ -0,0 +1,243 @@
+"""In-process bus journey planner built from the BusRoutes dataset.
+
+BusRoutes has stop sequences, cumulative distances and first/last bus times
+but no timetables, so journeys are ranked by an estimated cost in minutes:
+in-vehicle time at an average bus speed, a fixed wait per boarding and walking
+time for short transfers between nearby stops. The search is RAPTOR shaped:
+round k finds the cheapest way to reach every stop with k buses, which gives
+the best journey for each number of transfers.
+"""
+import math
+import threading
+from dataclasses import dataclass, field
+
+from app.services.spatial import GridIndex
+
+BUS_SPEED_KMH = 20.0       # average including stops, for in-vehicle time
+BOARDING_WAIT_MIN = 6.0    # expected wait each time we board a bus
+WALK_SPEED_MPS = 1.2
+MAX_WALK_M = 300.0         # transfers on foot between stops within this distance
+DAY_TYPES = ("WD", "SAT", "SUN")
+
+
+def parse_hhmm(value):
+    """'0530' -> 330 minutes after midnight, None for '-' or blank."""
+    if not value or not str(value).strip().isdigit():
+        return None
+    value = str(value).strip().zfill(4)
+    return int(value[:2]) * 60 + int(value[2:])
+
+
+def runs_at(first, last, minute) -> bool:
+    if first is None or last is None:
+        return False
+    if last < first:  # last bus after midnight
+        last += 24 * 60
+    return first <= minute <= last or first <= minute + 24 * 60 <= last
+
+
+@dataclass
+class Pattern:
+    service: str
+    direction: int
+    operator: str
+    stops: list = field(default_factory=list)   # stop indexes in travel order
+    km: list = field(default_factory=list)      # cumulative distance per stop
+    hours: list = field(default_factory=list)   # {day: (first, last)} per stop
+
+
+class RoutingGraph:
+    """Stop/service graph, built once per BusRoutes / BusStops version and kept in memory."""
+
+    def __init__(self, bus_routes, bus_stops=()):
+        self.source = bus_routes
+        self.stops_source = bus_stops
+        self.stop_codes = []
+        self.stop_index = {}
+        self.patterns = []
+        self.stop_patterns = []     # stop -> [(pattern, position)]
+        self.footpaths = []         # stop -> [(stop, minutes)]
+        self.stop_info = {s.get("BusStopCode"): s for s in bus_stops}
+
+        by_pattern = {}
+        for r in bus_routes:
+            key = (r.get("ServiceNo"), r.get("Direction"))
+            by_pattern.setdefault(key, []).append(r)
+
+        for (service, direction), rows in by_pattern.items():
+            rows.sort(key=lambda r: r.get("StopSequence") or 0)
+            pattern = Pattern(service, direction, rows[0].get("Operator"))
+            km = 0.0
+            for r in rows:
+                km = r.get("Distance") if r.get("Distance") is not None else km
+                pattern.stops.append(self._stop(r.get("BusStopCode")))
+                pattern.km.append(float(km))
+                pattern.hours.append({
+                    day: (parse_hhmm(r.get(f"{day}_FirstBus")), parse_hhmm(r.get(f"{day}_LastBus")))
+                    for day in DAY_TYPES
+                })
+            self.patterns.append(pattern)
+
+        self.stop_patterns = [[] for _ in self.stop_codes]
+        for p, pattern in enumerate(self.patterns):
+            for pos, stop in enumerate(pattern.stops):
+                self.stop_patterns[stop].append((p, pos))
+
+        self.footpaths = [[] for _ in self.stop_codes]
+        located = [s for s in bus_stops if s.get("BusStopCode") in self.stop_index]
+        if located:
+            grid = GridIndex(located)
+            for s in located:
+                a = self.stop_index[s["BusStopCode"]]
+                for metres, other in grid.within_radius(float(s["Latitude"]), float(s["Longitude"]), MAX_WALK_M):
+                    b = self.stop_index[other["BusStopCode"]]
+                    if a != b:
+                        self.footpaths[a].append((b, metres / WALK_SPEED_MPS / 60))
+
+    def _stop(self, code):
+        index = self.stop_index.get(code)
+        if index is None:
+            index = self.stop_index[code] = len(self.stop_codes)
+            self.stop_codes.append(code)
+        return index
+
+    def plan(self, origin: str, destination: str, max_transfers: int = 2,
+             depart_minute: int = None, day: str = "WD"):
+        """Best journey per number of buses used (fewer transfers first).
+
+        depart_minute (minutes after midnight) filters out services that are
+        not running at the boarding stop at the estimated boarding time.
+        """
+        if origin not in self.stop_index:
+            raise KeyError(f"Unknown bus stop {origin}")
+        if destination not in self.stop_index:
+            raise KeyError(f"Unknown bus stop {destination}")
+        source, target = self.stop_index[origin], self.stop_index[destination]
+        min_per_km = 60.0 / BUS_SPEED_KMH
+
+        best = {source: 0.0}
+        labels = [{source: 0.0}]
+        parents = [{}]
+        marked = {source}
+        for stop, minutes in self.footpaths[source]:
+            if minutes < best.get(stop, math.inf):
+                best[stop] = labels[0][stop] = minutes
+                parents[0][stop] = ("walk", source, minutes)
+                marked.add(stop)
+
+        for k in range(1, max_transfers + 2):
+            previous = labels[k - 1]
+            current, parent = {}, {}
+            labels.append(current)
+            parents.append(parent)
+
+            # earliest marked position on every pattern that serves a marked stop
+            queue = {}
+            for stop in marked:
+                for p, pos in self.stop_patterns[stop]:
+                    if pos < queue.get(p, math.inf):
+                        queue[p] = pos
+
+            new_marks = set()
+            best_get, reached_get = best.get, previous.get
+            for p, start in queue.items():
+                pattern = self.patterns[p]
+                stops, km = pattern.stops, pattern.km
+                board_pos, board_cost, on_bus = None, 0.0, math.inf
+                for pos in range(start, len(stops)):
+                    stop = stops[pos]
+                    if board_pos is not None:
+                        on_bus = board_cost + (km[pos] - km[board_pos]) * min_per_km
+                        if on_bus < best_get(stop, math.inf) and on_bus < best_get(target, math.inf):
+                            best[stop] = current[stop] = on_bus
+                            parent[stop] = ("bus", p, board_pos, pos)
+                            new_marks.add(stop)
+                    reached = reached_get(stop)
+                    if reached is not None and reached + BOARDING_WAIT_MIN < on_bus:
+                        first, last = pattern.hours[pos].get(day, (None, None))
+                        if depart_minute is None or runs_at(first, last, depart_minute + int(reached)):
+                            board_pos = pos
+                            board_cost = on_bus = reached + BOARDING_WAIT_MIN
+
+            for stop in list(new_marks):
+                for other, minutes in self.footpaths[stop]:
+                    cost = current[stop] + minutes
+                    if cost < min(best.get(other, math.inf), best.get(target, math.inf)):
+                        best[other] = current[other] = cost
+                        parent[other] = ("walk", stop, minutes)
+                        new_marks.add(other)
+
+            marked = new_marks
+            if not marked:
+                break
+
+        journeys = []
+        for k in range(1, len(labels)):
+            if target in labels[k]:
+                journeys.append(self._journey(parents, k, target, labels[k][target]))
+        return journeys
+
+    def _journey(self, parents, k, target, minutes):
+        legs, stop = [], target
+        while True:
+            step = parents[k].get(stop)
+            if step is None:
+                break
+            if step[0] == "walk":
+                _, walked_from, walk_minutes = step
+                legs.append({
+                    "mode": "WALK",
+                    "from": self.stop_codes[walked_from],
+                    "to": self.stop_codes[stop],
+                    "minutes": round(walk_minutes, 1),
+                })
+                stop = walked_from
+                continue
+            _, p, board_pos, alight_pos = step
+            pattern = self.patterns[p]
+            legs.append({
+                "mode": "BUS",
+                "ServiceNo": pattern.service,
+                "Direction": pattern.direction,
+                "Operator": pattern.operator,
+                "from": self.stop_codes[pattern.stops[board_pos]],
+                "to": self.stop_codes[pattern.stops[alight_pos]],
+                "stops": alight_pos - board_pos,
+                "distance_km": round(pattern.km[alight_pos] - pattern.km[board_pos], 2),
+            })
+            stop = pattern.stops[board_pos]
+            k -= 1
+        legs.reverse()
+        for leg in legs:
+            for end in ("from", "to"):
+                info = self.stop_info.get(leg[end])
+                if info:
+                    leg[f"{end}_name"] = info.get("Description")
+        return {
+            "transfers": sum(1 for leg in legs if leg["mode"] == "BUS") - 1,
+            "estimated_minutes": round(minutes, 1),
+            "legs": legs,
+        }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _current(graph, bus_routes, bus_stops) -> bool:
+    return graph is not None and graph.source is bus_routes and graph.stops_source is bus_stops
+
+
+def graph_for(bus_routes, bus_stops=()) -> RoutingGraph:
+    """Routing graph for the cached BusRoutes and BusStops lists, rebuilt when
+    either changes (stop names and walking footpaths come from BusStops).
+    Called from worker threads; requests arriving during a rebuild wait for
+    it instead of building their own copy."""
+    global _graph
+    graph = _graph
+    if _current(graph, bus_routes, bus_stops):
+        return graph
+    with _graph_lock:
+        if not _current(_graph, bus_routes, bus_stops):
+            _graph = RoutingGraph(bus_routes, bus_stops)
+        return _graph
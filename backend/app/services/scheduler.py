@@ -0,0 +1,85 @@
+"""Background prefetching of DataMall datasets.
+
+Every dataset flagged prefetch (realtime feeds) or snapshot (static datasets)
+gets its own polling task. A task reloads its cache entry a little before the
+TTL runs out, with jitter so the polls do not line up, which keeps the entry
+fresh and lets the routes answer from memory without calling DataMall.
+
+With several workers, a reload may hand back the shared copy another worker
+has not refreshed yet. The poll then checks again after a short back-off
+rather than spinning until the refresher publishes.
+"""
+import asyncio
+import random
+from contextlib import suppress
+
+import httpx
+
+from app.services import datamall
+from app.services.datamall import DATASETS, TRAIN_LINES
+from app.services.datamall_async import dataset_cache, refresh_dataset
+from app.services.resilience import CircuitOpenError
+
+REFRESH_AT = 0.8        # reload once an entry has used this share of its TTL
+JITTER = 0.1            # +/- share of the interval added to every sleep
+RETRY_AFTER = 30.0      # seconds before retrying a failed poll
+
+
+def prefetch_jobs():
+    """(dataset, parameter) pairs kept warm in the background."""
+    jobs = []
+    for name, dataset in DATASETS.items():
+        if not (dataset.prefetch or dataset.snapshot):
+            continue
+        if dataset.param == "TrainLine":
+            jobs.extend((name, line) for line in TRAIN_LINES)
+        elif dataset.param is None:
+            jobs.append((name, None))
+    return jobs
+
+
+class PrefetchScheduler:
+    def __init__(self, jobs=None):
+        self.jobs = prefetch_jobs() if jobs is None else jobs
+        self.tasks = []
+
+    def start(self):
+        if not datamall.DATAMALL_PREFETCH or not datamall.DATAMALL_API_KEY:
+            return
+        self.tasks = [asyncio.create_task(self._poll(name, value)) for name, value in self.jobs]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self.tasks = []
+
+    async def _poll(self, name, value):
+        dataset = DATASETS[name]
+        interval = dataset.ttl * REFRESH_AT
+        # spread the first round of polls instead of firing them all at startup
+        await asyncio.sleep(random.uniform(0, min(5.0, interval * JITTER)))
+        while True:
+            entry = dataset_cache.peek((name, value))
+            if entry is None or entry.age >= interval:
+                try:
+                    entry = await refresh_dataset(name, value)
+                except CircuitOpenError:
+                    entry = None
+                except httpx.HTTPError as e:
+                    print(f"Prefetch of {dataset.label} failed:", e)
+                    entry = None
+                except Exception as e:
+                    # a bad body, a failed snapshot write or a listener bug must not end the poll
+                    print(f"Prefetch of {dataset.label} failed unexpectedly: {e!r}")
+                    entry = None
+            if entry is None:
+                delay = min(RETRY_AFTER, interval)
+            elif entry.age >= interval:
+                # still the old shared copy: wait for the refresher, not a 1s spin
+                delay = min(RETRY_AFTER, (dataset.ttl - interval) / 2)
+            else:
+                delay = interval - entry.age
+            await asyncio.sleep(max(1.0, delay) * random.uniform(1 - JITTER, 1 + JITTER))
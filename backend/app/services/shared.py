@@ -0,0 +1,230 @@
+"""Dataset cache shared by every uvicorn worker on the host.
+
+Each (dataset, parameter) pair is one file in DATAMALL_SHARED_DIR (tmpfs at
+/dev/shm where available) holding the records column by column: numeric
+fields as packed little-endian arrays, strings as one UTF-8 blob plus offsets
+(dictionary encoded when values repeat, like stop codes along routes), and
+anything else as JSON text per row. Workers memory-map the files, so the
+numeric columns (coordinates, stop sequences, distances) are read zero-copy
+and the pages themselves live once in the page cache.
+
+Stores are namespaced by origin, a hash of the DataMall base URL and account
+key: each store lives in its own subdirectory and every file records its
+origin, so workers never pick up data fetched from another upstream (a test
+double, another deployment) on the same host.
+
+Files are written to a temporary name and renamed into place, so a reader
+always maps one complete version. One worker at a time holds the refresher
+lock (fcntl.flock, released by the kernel if the worker dies) and keeps the
+shared copies fresh; the others read them instead of calling DataMall.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import time
+from itertools import accumulate
+from urllib.parse import quote
+
+import numpy as np
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every worker keeps its own cache
+    fcntl = None
+
+_default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_DIR = os.getenv("DATAMALL_SHARED_DIR", os.path.join(_default_dir, "transitgo-datamall"))
+SHARED_CACHE = (
+    fcntl is not None and os.getenv("DATAMALL_SHARED_CACHE", "1").lower() not in ("0", "false", "no")
+)
+
+MAGIC = b"TGC1"
+NUMERIC = ("i8", "f8")
+_MISSING = object()
+_INT64 = (-(2 ** 63), 2 ** 63 - 1)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _column_kind(values) -> str:
+    if all(type(v) is int for v in values) and all(_INT64[0] <= v <= _INT64[1] for v in values):
+        return "i8"
+    if all(type(v) is float for v in values):
+        return "f8"
+    if all(type(v) is str for v in values):
+        return "str"
+    return "json"  # mixed, nested, null or absent in some records
+
+
+def encode_table(records, dataset: str, param=None, fetched_at: float = None, origin: str = "") -> bytes:
+    """Columnar file image of a list of flat-ish dicts."""
+    names = list(dict.fromkeys(key for record in records for key in record))
+    columns, chunks, position = [], [], 0
+
+    def add(data: bytes) -> int:
+        nonlocal position
+        start = position
+        chunks.append(data + b"\0" * (_align(len(data)) - len(data)))
+        position += _align(len(data))
+        return start
+
+    def add_strings(values):
+        # offsets count characters, so the blob is decoded once and sliced
+        offsets = np.fromiter(accumulate(map(len, values), initial=0), dtype="<u4", count=len(values) + 1)
+        blob = "".join(values).encode()
+        return [add(offsets.tobytes()), add(blob), len(blob)]
+
+    for name in names:
+        values = [record.get(name, _MISSING) for record in records]
+        kind = _column_kind(values)
+        if kind in NUMERIC:
+            columns.append([name, kind, add(np.asarray(values, dtype="<" + kind).tobytes())])
+            continue
+        if kind == "json":
+            values = ["" if v is _MISSING else orjson.dumps(v).decode() for v in values]
+        categories = dict.fromkeys(values) if kind == "str" else None
+        if categories is not None and len(categories) * 2 <= len(values):
+            # stop codes, operators, service numbers: store each distinct string once
+            codes = {value: code for code, value in enumerate(categories)}
+            index = np.fromiter((codes[v] for v in values), dtype="<u4", count=len(values))
+            columns.append([name, "cat", add(index.tobytes()), len(codes), *add_strings(list(categories))])
+        else:
+            columns.append([name, kind, *add_strings(values)])
+
+    header = orjson.dumps({
+        "dataset": dataset, "param": param or "", "origin": origin, "rows": len(records),
+        "fetched_at": time.time() if fetched_at is None else fetched_at, "columns": columns,
+    })
+    preamble = MAGIC + struct.pack("<I", len(header)) + header
+    return preamble + b"\0" * (_align(len(preamble)) - len(preamble)) + b"".join(chunks)
+
+
+class SharedTable:
+    """Read-only view of one shared file."""
+
+    def __init__(self, path: str, records=None):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        magic, size = struct.unpack_from("<4sI", self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shared dataset file")
+        header = orjson.loads(self._map[8:8 + size])
+        self._base = _align(8 + size)
+        self.dataset, self.param = header["dataset"], header["param"]
+        self.origin = header.get("origin", "")
+        self.rows, self.fetched_at = header["rows"], header["fetched_at"]
+        self._columns = {column[0]: column[1:] for column in header["columns"]}
+        self._records = records
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def names(self):
+        return list(self._columns)
+
+    def _strings(self, count, offsets_start, blob_start, blob_size):
+        offsets = np.frombuffer(self._map, dtype="<u4", count=count + 1, offset=self._base + offsets_start).tolist()
+        text = self._map[self._base + blob_start:self._base + blob_start + blob_size].decode()
+        return [text[a:b] for a, b in zip(offsets, offsets[1:])]
+
+    def column(self, name: str):
+        """A numpy view into the mapping for numeric columns, otherwise a list
+        (with _MISSING where a record had no such field)."""
+        kind, start, *rest = self._columns[name]
+        if kind in NUMERIC:
+            return np.frombuffer(self._map, dtype="<" + kind, count=self.rows, offset=self._base + start)
+        if kind == "cat":
+            count, *strings = rest
+            categories = self._strings(count, *strings)
+            codes = np.frombuffer(self._map, dtype="<u4", count=self.rows, offset=self._base + start)
+            return [categories[code] for code in codes.tolist()]
+        values = self._strings(self.rows, start, *rest)
+        if kind == "json":
+            values = [orjson.loads(v) if v else _MISSING for v in values]
+        return values
+
+    def records(self) -> list:
+        """The rows as dicts, built once per table."""
+        if self._records is None:
+            records = [{} for _ in range(self.rows)]
+            for name, (kind, *_) in self._columns.items():
+                values = self.column(name)
+                if kind in NUMERIC:
+                    values = values.tolist()
+                for record, value in zip(records, values):
+                    if value is not _MISSING:
+                        record[name] = value
+            self._records = records
+        return self._records
+
+
+class SharedStore:
+    def __init__(self, directory: str = SHARED_DIR, origin: str = ""):
+        self.origin = origin
+        self.directory = os.path.join(directory, origin) if origin else directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._tables = {}       # path -> last SharedTable mapped from it
+        self._lock_file = None
+
+    def _path(self, dataset: str, param=None) -> str:
+        return os.path.join(self.directory, f"{dataset}.{quote(param or '', safe='')}.col")
+
+    def publish(self, dataset: str, records: list, param=None, fetched_at: float = None):
+        """Atomically replace the shared copy. The writer keeps `records` as
+        the table's rows, so reading its own file back costs nothing."""
+        path = self._path(dataset, param)
+        data = encode_table(records, dataset, param, fetched_at, self.origin)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            table = SharedTable(tmp, records)   # same inode once renamed
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._tables[path] = table
+
+    def read(self, dataset: str, param=None):
+        """The current shared table, or None. Re-mapped only when the file changed;
+        a file written for another origin is ignored."""
+        path = self._path(dataset, param)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        table = self._tables.get(path)
+        if table is not None and table.stamp == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return table
+        try:
+            table = SharedTable(path)
+        except (OSError, ValueError) as e:
+            print(f"Unreadable shared copy of {dataset}:", e)
+            return None
+        if table.origin != self.origin:
+            print(f"Ignoring shared copy of {dataset} fetched from another DataMall origin.")
+            return None
+        self._tables[path] = table
+        return table
+
+    def is_refresher(self) -> bool:
+        """Whether this process is (or has just become) the elected refresher."""
+        if self._lock_file is not None:
+            return True
+        f = open(os.path.join(self.directory, "refresher.lock"), "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        print(f"Worker {os.getpid()} is the DataMall refresher.")
+        return True
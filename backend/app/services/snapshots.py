@@ -0,0 +1,83 @@
+"""On-disk snapshots of DataMall datasets so a restart starts warm.
+
+Each (dataset, parameter) pair is one SQLite row holding the zlib-compressed
+JSON records, a content hash used as the version stamp and the wall-clock
+time it was fetched.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SNAPSHOT_PATH = os.getenv("DATAMALL_SNAPSHOT_PATH", os.path.join(_BACKEND_DIR, "data", "datamall_snapshots.db"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    dataset    TEXT NOT NULL,
+    param      TEXT NOT NULL DEFAULT '',
+    version    TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    records    INTEGER NOT NULL,
+    payload    BLOB NOT NULL,
+    PRIMARY KEY (dataset, param)
+)
+"""
+
+
+@dataclass
+class Snapshot:
+    dataset: str
+    param: str
+    version: str
+    fetched_at: float
+    records: list
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+
+
+class SnapshotStore:
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:  # commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def save(self, dataset: str, records: list, param=None) -> str:
+        raw = json.dumps(records, separators=(",", ":")).encode()
+        version = hashlib.sha256(raw).hexdigest()[:16]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (dataset, param or "", version, time.time(), len(records), zlib.compress(raw, 6)),
+            )
+        return version
+
+    def load(self, dataset: str, param=None):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT dataset, param, version, fetched_at, payload FROM snapshots"
+                " WHERE dataset = ? AND param = ?",
+                (dataset, param or ""),
+            ).fetchone()
+        if row is None:
+            return None
+        name, param, version, fetched_at, payload = row
+        return Snapshot(name, param, version, fetched_at, json.loads(zlib.decompress(payload)))
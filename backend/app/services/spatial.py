@@ -0,0 +1,127 @@
+"""Uniform grid index for nearest / radius / bounding box queries over
+DataMall records that carry Latitude and Longitude fields."""
+import heapq
+import math
+
+EARTH_RADIUS_M = 6_371_000
+
+
+class GridIndex:
+    """Points are projected to metres on a local equirectangular plane (exact
+    enough at Singapore's scale) and bucketed into square cells, so a query only
+    touches the handful of cells around it."""
+
+    def __init__(self, records, cell_size_m: float = 250, lat_key="Latitude", lng_key="Longitude"):
+        self.records = records
+        self.cell_size = cell_size_m
+        self.cells = {}
+
+        points = [
+            (i, float(r[lat_key]), float(r[lng_key]))
+            for i, r in enumerate(records)
+            if r.get(lat_key) and r.get(lng_key)
+        ]
+        ref_lat = sum(p[1] for p in points) / len(points) if points else 0.0
+        self._m_per_deg_lat = math.pi * EARTH_RADIUS_M / 180
+        self._m_per_deg_lng = self._m_per_deg_lat * math.cos(math.radians(ref_lat))
+
+        for i, lat, lng in points:
+            x, y = self._project(lat, lng)
+            self.cells.setdefault(self._cell(x, y), []).append((x, y, i))
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.cells.values())
+
+    def _project(self, lat, lng):
+        return lng * self._m_per_deg_lng, lat * self._m_per_deg_lat
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def _cells_in(self, gx0, gy0, gx1, gy1):
+        """Buckets of the cells in an index range, skipping empty ones."""
+        if (gx1 - gx0 + 1) * (gy1 - gy0 + 1) > len(self.cells):
+            for (gx, gy), bucket in self.cells.items():
+                if gx0 <= gx <= gx1 and gy0 <= gy <= gy1:
+                    yield bucket
+            return
+        for gx in range(gx0, gx1 + 1):
+            for gy in range(gy0, gy1 + 1):
+                bucket = self.cells.get((gx, gy))
+                if bucket:
+                    yield bucket
+
+    def nearest(self, lat: float, lng: float, k: int = 10, max_distance_m: float = math.inf):
+        """Return up to k (distance_m, record) pairs, closest first."""
+        if k <= 0 or not self.cells:
+            return []
+        qx, qy = self._project(lat, lng)
+        cx, cy = self._cell(qx, qy)
+        max_ring = int(min(max_distance_m, 50_000) // self.cell_size) + 1
+        best = []  # max-heap of (-distance, index)
+        for r in range(max_ring + 1):
+            # anything not scanned yet lies at least r - 1 whole cells away
+            if len(best) == k and -best[0][0] <= (r - 1) * self.cell_size:
+                break
+            for cell in self._ring(cx, cy, r):
+                for x, y, i in self.cells.get(cell, ()):
+                    d = math.hypot(x - qx, y - qy)
+                    if d > max_distance_m:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+        return [(-d, self.records[i]) for d, i in sorted(best, reverse=True)]
+
+    def within_radius(self, lat: float, lng: float, radius_m: float, limit: int = None):
+        """Return (distance_m, record) pairs within radius_m, closest first."""
+        qx, qy = self._project(lat, lng)
+        gx0, gy0 = self._cell(qx - radius_m, qy - radius_m)
+        gx1, gy1 = self._cell(qx + radius_m, qy + radius_m)
+        hits = []
+        for bucket in self._cells_in(gx0, gy0, gx1, gy1):
+            for x, y, i in bucket:
+                d = math.hypot(x - qx, y - qy)
+                if d <= radius_m:
+                    hits.append((d, i))
+        hits.sort()
+        return [(d, self.records[i]) for d, i in hits[:limit]]
+
+    def within_bbox(self, south: float, west: float, north: float, east: float, limit: int = None):
+        """Return records inside the box, in no particular order."""
+        x0, y0 = self._project(south, west)
+        x1, y1 = self._project(north, east)
+        gx0, gy0 = self._cell(x0, y0)
+        gx1, gy1 = self._cell(x1, y1)
+        found = []
+        for bucket in self._cells_in(gx0, gy0, gx1, gy1):
+            for x, y, i in bucket:
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    found.append(self.records[i])
+                    if limit is not None and len(found) >= limit:
+                        return found
+        return found
+
+
+_indexes = {}
+
+
+def index_for(name: str, records, **kwargs) -> GridIndex:
+    """Index for a dataset, rebuilt only when the cached records list changes."""
+    index = _indexes.get(name)
+    if index is None or index.records is not records:
+        index = GridIndex(records, **kwargs)
+        _indexes[name] = index
+    return index
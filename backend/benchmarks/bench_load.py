@@ -0,0 +1,193 @@
+"""Load scenarios against the real API, backed by local DataMall and
+PostgREST fakes, reporting p50/p99 latency and requests per second.
+
+The fakes run in this process; the API runs under uvicorn in a subprocess
+with DATAMALL_BASE_URL and SUPABASE_URL pointing at them:
+
+    python -m benchmarks.bench_load --duration 10 --concurrency 32
+    python -m benchmarks.bench_load --save baseline.json
+    python -m benchmarks.bench_load --baseline baseline.json   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import datamall_data, fake_datamall, fake_postgrest
+
+STOP_CODES = [s["BusStopCode"] for s in datamall_data()["BusStops"]]
+
+
+def scenarios(rng: random.Random):
+    """name -> function returning the next request path."""
+    return {
+        "busstops": lambda: "/api/busstops",
+        "busstops_page": lambda: "/api/busstops?RoadName=Orchard%20Rd&limit=200",
+        "busroutes_service": lambda: f"/api/busroutes?ServiceNo={rng.randint(2, 300)}&fields=BusStopCode,StopSequence",
+        "busarrivals": lambda: f"/api/busarrivals/{rng.choice(STOP_CODES[:200])}",
+        "busarrivals_batch": lambda: "/api/busarrivals?codes=" + ",".join(rng.sample(STOP_CODES[:200], 10)),
+        "taxi_heatmap": lambda: "/api/taxiavailability/heatmap?zoom=14",
+        "crowd_all_lines": lambda: "/api/stationcrowddensityrealtime",
+        "feedbacks_page": lambda: "/api/feedbacks/?limit=50",
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def serve(app, port: int):
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", backlog=4096))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run_scenario(client: httpx.AsyncClient, next_path, duration: float, concurrency: int):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                # read the body undecoded: decompressing here would load the client, not the API
+                async with client.stream("GET", next_path()) as response:
+                    async for _ in response.aiter_raw():
+                        pass
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def regressions(results, baseline, tolerance: float):
+    found = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if now["rps"] < before["rps"] * (1 - tolerance):
+            found.append(f"{name}: {before['rps']} -> {now['rps']} req/s")
+        if now["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+            found.append(f"{name}: p99 {before['p99_ms']} -> {now['p99_ms']} ms")
+    return found
+
+
+async def main(args):
+    datamall_port, postgrest_port, api_port = free_port(), free_port(), free_port()
+    fakes = [
+        await serve(fake_datamall(args.upstream_latency, args.error_rate), datamall_port),
+        await serve(fake_postgrest(args.db_latency), postgrest_port),
+    ]
+
+    env = {
+        **os.environ,
+        "DATAMALL_BASE_URL": f"http://127.0.0.1:{datamall_port}",
+        "DATAMALL_API_KEY": "bench",
+        # keep the fake datasets out of the real snapshot, shared and history stores
+        "DATAMALL_SNAPSHOT_PATH": os.path.join(tempfile.mkdtemp(), "snapshots.db"),
+        "DATAMALL_SHARED_DIR": tempfile.mkdtemp(),
+        "CROWD_HISTORY_DIR": tempfile.mkdtemp(),
+        "DATAMALL_PREFETCH": "1" if args.prefetch else "0",
+        "WEB_CONCURRENCY": str(args.workers),
+        "SUPABASE_URL": f"http://127.0.0.1:{postgrest_port}",
+        "SUPABASE_KEY": "bench",
+        "SUPABASE_SVC_KEY": "bench",
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+         "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=30,
+                               headers={"Accept-Encoding": "gzip, br"})
+    results = {}
+    try:
+        for _ in range(100):
+            try:
+                await client.get("/")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+        wanted = args.scenarios.split(",") if args.scenarios else None
+        print(f"DataMall latency {args.upstream_latency * 1000:.0f} ms, PostgREST latency "
+              f"{args.db_latency * 1000:.0f} ms, {args.concurrency} in flight, {args.duration:.0f} s per scenario")
+        print(f"{'scenario':<20} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for name, next_path in scenarios(rng).items():
+            if wanted and name not in wanted:
+                continue
+            await run_scenario(client, next_path, args.warmup, args.concurrency)
+            result = results[name] = await run_scenario(client, next_path, args.duration, args.concurrency)
+            print(f"{name:<20} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}")
+    finally:
+        await client.aclose()
+        api.terminate()
+        api.wait()
+        for server, task in fakes:
+            server.should_exit = True
+            await task
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API")
+    parser.add_argument("--scenarios", help="comma separated subset to run")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="seconds per DataMall call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of DataMall calls answered 503")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="seconds per PostgREST call")
+    parser.add_argument("--prefetch", action="store_true", help="run the background prefetch scheduler")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare with a saved JSON run and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    sys.exit(asyncio.run(main(parser.parse_args())))
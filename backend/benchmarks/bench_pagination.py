@@ -0,0 +1,57 @@
+"""Full BusRoutes load time: sequential $skip paging vs the concurrent fetcher.
+
+Runs against an in-process fake DataMall (no network, no API key needed):
+
+    python -m benchmarks.bench_pagination --rows 26000 --latency 0.15
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.services import datamall_async
+from app.services.datamall import DATAMALL_PAGE_SIZE
+
+
+def fake_datamall(rows: int, latency: float):
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(latency)
+        skip = int(request.url.params.get("$skip", 0))
+        count = max(0, min(DATAMALL_PAGE_SIZE, rows - skip))
+        value = [
+            {"ServiceNo": str(i // 60), "Direction": 1, "StopSequence": i % 60,
+             "BusStopCode": f"{i % 5000:05d}", "Distance": (i % 60) * 0.4}
+            for i in range(skip, skip + count)
+        ]
+        return httpx.Response(200, json={"value": value})
+    return httpx.MockTransport(handler)
+
+
+async def load(concurrency: int) -> tuple[int, float]:
+    start = time.perf_counter()
+    total = 0
+    async for page in datamall_async.iter_pages("BusRoutes", concurrency=concurrency):
+        total += len(page)
+    return total, time.perf_counter() - start
+
+
+async def main(rows: int, latency: float, concurrency: int):
+    datamall_async._client = httpx.AsyncClient(
+        transport=fake_datamall(rows, latency), base_url="http://datamall.test/"
+    )
+    try:
+        for label, fan_out in (("sequential", 1), (f"concurrent x{concurrency}", concurrency)):
+            total, elapsed = await load(fan_out)
+            print(f"{label:<16} {total:>7} rows  {elapsed * 1000:8.1f} ms")
+    finally:
+        await datamall_async.close_async_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=26000)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per upstream page")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.latency, args.concurrency))
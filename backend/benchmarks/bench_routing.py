@@ -0,0 +1,70 @@
+"""Journey planner build time and queries per second on a synthetic network.
+
+The network is a city-sized grid of bus services (about the size of the real
+BusRoutes dataset), so no DataMall access is needed:
+
+    python -m benchmarks.bench_routing --queries 500
+"""
+import argparse
+import random
+import time
+
+from app.services.routing import RoutingGraph
+
+
+def synthetic_network(size: int = 70, spacing_km: float = 0.4):
+    """size x size grid of stops with one service along every row and column
+    (both directions), about 4*size services and 4*size*size route records."""
+    stops, routes = [], []
+    for y in range(size):
+        for x in range(size):
+            stops.append({
+                "BusStopCode": f"{y:02d}{x:03d}",
+                "Description": f"Stop {x},{y}",
+                "Latitude": 1.25 + y * spacing_km / 111.2,
+                "Longitude": 103.65 + x * spacing_km / 111.2,
+            })
+
+    def add_service(service, cells):
+        for direction, ordered in ((1, cells), (2, cells[::-1])):
+            for seq, (x, y) in enumerate(ordered, start=1):
+                routes.append({
+                    "ServiceNo": service, "Operator": "SBST", "Direction": direction,
+                    "StopSequence": seq, "BusStopCode": f"{y:02d}{x:03d}",
+                    "Distance": round((seq - 1) * spacing_km, 1),
+                    "WD_FirstBus": "0530", "WD_LastBus": "0030",
+                    "SAT_FirstBus": "0530", "SAT_LastBus": "0030",
+                    "SUN_FirstBus": "0600", "SUN_LastBus": "2330",
+                })
+
+    for i in range(size):
+        add_service(f"R{i}", [(x, i) for x in range(size)])
+        add_service(f"C{i}", [(i, y) for y in range(size)])
+    return routes, stops
+
+
+def main(queries: int, max_transfers: int):
+    routes, stops = synthetic_network()
+    start = time.perf_counter()
+    graph = RoutingGraph(routes, stops)
+    print(f"graph: {len(graph.stop_codes)} stops, {len(graph.patterns)} patterns, "
+          f"{len(routes)} route records, built in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    rng = random.Random(42)
+    codes = graph.stop_codes
+    pairs = [(rng.choice(codes), rng.choice(codes)) for _ in range(queries)]
+    found = 0
+    start = time.perf_counter()
+    for origin, destination in pairs:
+        found += bool(graph.plan(origin, destination, max_transfers, depart_minute=8 * 60))
+    elapsed = time.perf_counter() - start
+    print(f"{queries} queries (max {max_transfers} transfers): {queries / elapsed:.0f} queries/s, "
+          f"{elapsed / queries * 1000:.2f} ms/query, {found} with a journey")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--max-transfers", type=int, default=2)
+    args = parser.parse_args()
+    main(args.queries, args.max_transfers)
@@ -0,0 +1,110 @@
+"""Idle SSE connections per worker and change fan-out latency.
+
+Starts the app with uvicorn in this process, opens --clients idle
+/api/stream/crowddensity connections, then publishes crowd level changes and
+times how long it takes until every client has received each one:
+
+    python -m benchmarks.bench_sse --clients 2000 --updates 5
+
+Client sockets live in the same process, so the memory figure is an upper
+bound for the server side.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("SUPABASE_SVC_KEY", "bench")
+os.environ["DATAMALL_PREFETCH"] = "0"
+
+import uvicorn  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.services import broadcast  # noqa: E402
+from app.services.datamall import TRAIN_LINES  # noqa: E402
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def crowd_rows(level: str):
+    return [{"Station": f"S{i}", "StartTime": "", "EndTime": "", "CrowdLevel": level} for i in range(30)]
+
+
+async def client(port: int, ready: asyncio.Event, counter: dict, expected_updates: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /api/stream/crowddensity HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+    await writer.drain()
+    seen = 0
+    try:
+        while seen <= expected_updates:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"event: snapshot"):
+                counter["connected"] += 1
+                if counter["connected"] == counter["clients"]:
+                    ready.set()
+            elif line.startswith(b"event: update"):
+                seen += 1
+                counter["received"] += 1
+                if counter["received"] % counter["clients"] == 0:
+                    counter["done"].set()
+    finally:
+        writer.close()
+
+
+async def main(clients: int, updates: int, port: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, clients * 2 + 256)), hard))
+
+    for line in TRAIN_LINES:
+        broadcast.crowd_density.publish(line, crowd_rows("l"))
+
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", backlog=4096))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    base = rss_mb()
+    counter = {"clients": clients, "connected": 0, "received": 0, "done": asyncio.Event()}
+    ready = asyncio.Event()
+    start = time.perf_counter()
+    tasks = []
+    for _ in range(clients):
+        tasks.append(asyncio.create_task(client(port, ready, counter, updates)))
+        if len(tasks) % 200 == 0:
+            await asyncio.sleep(0)
+    await asyncio.wait_for(ready.wait(), timeout=120)
+    print(f"{clients} SSE connections open in {time.perf_counter() - start:.1f} s, "
+          f"+{rss_mb() - base:.0f} MB RSS ({(rss_mb() - base) * 1024 / clients:.1f} KB per connection)")
+
+    for n in range(updates):
+        counter["done"].clear()
+        start = time.perf_counter()
+        broadcast.crowd_density.publish("EWL", crowd_rows("mhl"[n % 3]))
+        await asyncio.wait_for(counter["done"].wait(), timeout=60)
+        print(f"update {n + 1}: delivered to all {clients} clients in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    server.should_exit = True
+    await serve
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.updates, args.port))
@@ -0,0 +1,97 @@
+"""Feedback listing throughput as in-flight requests grow: the old pattern
+(sync Supabase client called from an async route) vs the async client.
+
+Runs against an in-process fake PostgREST with a fixed round-trip latency,
+so no Supabase project is needed:
+
+    python -m benchmarks.bench_supabase --latency 0.02 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_KEY", "anon")
+os.environ.setdefault("SUPABASE_SVC_KEY", "service")
+
+from supabase import create_client  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.services import dbconfig  # noqa: E402
+
+ROWS = [
+    {"id": i, "created_at": f"2025-01-01T00:00:{i % 60:02d}+00:00", "title": "Late bus",
+     "description": "Bus 10 was late", "type": "bus", "rating": 3, "user": {"username": f"user{i}"}}
+    for i in range(51)
+]
+
+
+def sync_postgrest(latency: float):
+    def handler(request: httpx.Request):
+        time.sleep(latency)
+        return httpx.Response(200, json=ROWS)
+    return httpx.MockTransport(handler)
+
+
+def async_postgrest(latency: float):
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=ROWS)
+    return httpx.MockTransport(handler)
+
+
+async def run(call, requests: int, in_flight: int) -> float:
+    """Requests per second with `in_flight` concurrent callers."""
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(in_flight)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main(latency: float, requests: int, levels):
+    # before: the blocking client inside the coroutine, as the routes used to do
+    blocking = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    rest = blocking.postgrest
+    rest.session = httpx.Client(transport=sync_postgrest(latency), base_url=rest.session.base_url,
+                                headers=rest.session.headers)
+
+    async def before():
+        blocking.table("feedback").select("*").order("created_at", desc=True).limit(51).execute()
+
+    # now: the real route on the shared async client
+    rest = dbconfig.supabase.postgrest
+    rest.session = httpx.AsyncClient(transport=async_postgrest(latency), base_url=rest.session.base_url,
+                                     headers=rest.session.headers)
+    api = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api.test")
+
+    async def now():
+        response = await api.get("/api/feedbacks/", params={"limit": 50})
+        response.raise_for_status()
+
+    print(f"fake PostgREST latency {latency * 1000:.0f} ms, {requests} requests per run")
+    print(f"{'in flight':>9}  {'sync client req/s':>18}  {'async client req/s':>19}")
+    try:
+        for in_flight in levels:
+            sync_rps = await run(before, min(requests, in_flight * 10), in_flight)
+            async_rps = await run(now, requests, in_flight)
+            print(f"{in_flight:>9}  {sync_rps:>18.0f}  {async_rps:>19.0f}")
+    finally:
+        await api.aclose()
+        await dbconfig.close_db_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per PostgREST call")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--levels", default="1,8,32,128", help="comma separated in-flight request counts")
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.requests, [int(n) for n in args.levels.split(",")]))
@@ -0,0 +1,169 @@
+"""Local stand-ins for LTA DataMall and Supabase PostgREST.
+
+Both are small ASGI apps with synthetic data shaped like the real services
+(DataMall's 500-row $skip pages, the v3 BusArrival layout, PostgREST's
+select/limit/order query string). Latency and error rate are configurable so
+load scenarios can be repeated without touching the real APIs.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
+
+PAGE_SIZE = 500
+SGT = timezone(timedelta(hours=8))
+ROADS = ("Victoria St", "Orchard Rd", "Bukit Timah Rd", "Upp Changi Rd East", "Ang Mo Kio Ave 3",
+         "Jurong West St 64", "Tampines Ave 4", "Woodlands Ave 2", "Serangoon Rd", "Clementi Ave 6")
+
+
+def datamall_data(seed: int = 1, stops: int = 5100, services: int = 360, taxis: int = 3000):
+    rng = random.Random(seed)
+    bus_stops = [
+        {"BusStopCode": f"{i * 17 % 99999:05d}", "RoadName": rng.choice(ROADS),
+         "Description": f"Opp Blk {rng.randint(1, 999)}", "Latitude": 1.25 + rng.random() * 0.2,
+         "Longitude": 103.65 + rng.random() * 0.35}
+        for i in range(stops)
+    ]
+    codes = [s["BusStopCode"] for s in bus_stops]
+    bus_services, bus_routes = [], []
+    for n in range(services):
+        service_no = str(n + 2) if n % 7 else f"{n + 2}e"
+        operator = rng.choice(("SBST", "SMRT", "TTS", "GAS"))
+        for direction in (1, 2):
+            bus_services.append({
+                "ServiceNo": service_no, "Operator": operator, "Direction": direction, "Category": "TRUNK",
+                "OriginCode": rng.choice(codes), "DestinationCode": rng.choice(codes),
+                "AM_Peak_Freq": "08-12", "AM_Offpeak_Freq": "10-14", "PM_Peak_Freq": "08-12",
+                "PM_Offpeak_Freq": "12-15", "LoopDesc": "",
+            })
+            km = 0.0
+            for seq, code in enumerate(rng.sample(codes, 36), start=1):
+                bus_routes.append({
+                    "ServiceNo": service_no, "Operator": operator, "Direction": direction,
+                    "StopSequence": seq, "BusStopCode": code, "Distance": round(km, 1),
+                    "WD_FirstBus": "0530", "WD_LastBus": "2330", "SAT_FirstBus": "0530",
+                    "SAT_LastBus": "2330", "SUN_FirstBus": "0600", "SUN_LastBus": "2330",
+                })
+                km += 0.3 + rng.random() * 0.6
+    taxi_points = [
+        {"Latitude": 1.25 + rng.random() * 0.2, "Longitude": 103.65 + rng.random() * 0.35}
+        for _ in range(taxis)
+    ]
+    taxi_stands = [
+        {"TaxiCode": f"A{i:02d}", "Latitude": 1.25 + rng.random() * 0.2, "Longitude": 103.65 + rng.random() * 0.35,
+         "Bfa": "Yes", "Ownership": "LTA", "Type": "Stand", "Name": f"Taxi stand {i}"}
+        for i in range(300)
+    ]
+    return {
+        "BusStops": bus_stops,
+        "BusServices": bus_services,
+        "BusRoutes": bus_routes,
+        "Taxi-Availability": taxi_points,
+        "TaxiStands": taxi_stands,
+        # DataMall returns this one as a single object, not a list of records
+        "TrainServiceAlerts": {"Status": 1, "AffectedSegments": [], "Message": []},
+    }
+
+
+def next_bus(rng, minutes):
+    eta = datetime.now(SGT) + timedelta(minutes=minutes)
+    return {
+        "OriginCode": "77009", "DestinationCode": "77009", "EstimatedArrival": eta.isoformat(timespec="seconds"),
+        "Monitored": 1, "Latitude": f"{1.3 + rng.random() * 0.05:.6f}", "Longitude": f"{103.8 + rng.random() * 0.05:.6f}",
+        "VisitNumber": "1", "Load": rng.choice(("SEA", "SDA", "LSD")), "Feature": "WAB", "Type": "DD",
+    }
+
+
+def fake_datamall(latency: float = 0.05, error_rate: float = 0.0, seed: int = 1) -> FastAPI:
+    """DataMall with pagination, BusArrival by stop and crowd density by line."""
+    app = FastAPI()
+    data = datamall_data(seed)
+    rng = random.Random(seed)
+
+    async def delay():
+        await asyncio.sleep(latency * (0.5 + rng.random()))
+        if rng.random() < error_rate:
+            return Response(status_code=503)
+        return None
+
+    @app.get("/v3/BusArrival")
+    async def bus_arrival(BusStopCode: str):
+        if failed := await delay():
+            return failed
+        services = [
+            {"ServiceNo": str(2 + (int(BusStopCode) + i * 13) % 300), "Operator": "SBST",
+             "NextBus": next_bus(rng, 2 + i), "NextBus2": next_bus(rng, 10 + i), "NextBus3": next_bus(rng, 20 + i)}
+            for i in range(6)
+        ]
+        return ORJSONResponse({"odata.metadata": "", "BusStopCode": BusStopCode, "Services": services})
+
+    @app.get("/PCDRealTime")
+    @app.get("/PCDForecast")
+    async def crowd_density(TrainLine: str):
+        if failed := await delay():
+            return failed
+        value = [
+            {"Station": f"{TrainLine}{i}", "StartTime": "", "EndTime": "", "CrowdLevel": rng.choice("lmh")}
+            for i in range(1, 30)
+        ]
+        return ORJSONResponse({"value": value})
+
+    @app.get("/{dataset}")
+    async def dataset(dataset: str, request: Request):
+        if dataset not in data:
+            return Response(status_code=404)
+        if failed := await delay():
+            return failed
+        value = data[dataset]
+        if isinstance(value, list):
+            skip = int(request.query_params.get("$skip", 0))
+            value = value[skip:skip + PAGE_SIZE]
+        return ORJSONResponse({"odata.metadata": "", "value": value})
+
+    return app
+
+
+def fake_postgrest(latency: float = 0.01, feedbacks: int = 20000, users: int = 5000, seed: int = 1) -> FastAPI:
+    """PostgREST subset: newest-first GET with limit on feedback and users,
+    replies by feedback_id=in.(...), and inserts."""
+    app = FastAPI()
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    feedback_rows = [
+        {"id": i, "created_at": (start + timedelta(minutes=i)).isoformat(), "title": "Bus was late",
+         "description": "Waited 20 minutes at the stop " * 3, "type": rng.choice(("bus", "train", "app")),
+         "rating": rng.randint(1, 5), "user_id": f"00000000-0000-0000-0000-{i % users:012d}",
+         "user": {"username": f"user{i % users}"}}
+        for i in range(feedbacks, 0, -1)
+    ]
+    user_rows = [
+        {"uid": f"00000000-0000-0000-0000-{i:012d}", "username": f"user{i}", "email": f"user{i}@example.com"}
+        for i in range(users)
+    ]
+    tables = {"feedback": feedback_rows, "users": user_rows}
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        await asyncio.sleep(latency)
+        params = request.query_params
+        limit = int(params.get("limit", 1000))
+        if table == "replies":
+            ids = params.get("feedback_id", "").removeprefix("eq.").removeprefix("in.(").rstrip(")").split(",")
+            rows = [
+                {"id": int(fid) * 10 + n, "feedback_id": int(fid), "content": "Thanks, we are looking into it",
+                 "created_at": start.isoformat(), "user_id": "admin", "user": {"username": "admin"}}
+                for fid in ids if fid.isdigit() for n in range(2)
+            ]
+            return ORJSONResponse(rows)
+        return ORJSONResponse(tables.get(table, [])[:limit])
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        await asyncio.sleep(latency)
+        row = await request.json()
+        return ORJSONResponse([{"id": rng.randint(1, 10**6), "created_at": datetime.now(timezone.utc).isoformat(), **row}],
+                              status_code=201)
+
+    return app
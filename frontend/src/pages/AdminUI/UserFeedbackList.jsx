@@ -1,10 +1,11 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import FeedbackCard from "../../components/FeedbackCard.jsx";
 import { user_loggedin, user_isadmin } from "../../supabaseClient.js";
 import {
-  getFeedbacks,
+  getFeedbacksPage,
   deleteFeedback,
   getReplies,
+  getRepliesBatch,
   deleteReply,
   postReply
 } from "../../services/api.js";
@@ -20,30 +21,60 @@ export default function FeedbackPage() {
   const [openId, setOpenId] = useState(null);
   const [repliesMap, setRepliesMap] = useState(() => ({})); // { [fid]: { phase, items, error } }
 
-  const load = async () => {
+  const [cursor, setCursor] = useState(null); // next_cursor of the last loaded page
+  const [search, setSearch] = useState(""); // the term the loaded pages were filtered by
+  const latest = useRef(0); // drops responses to an older search
+
+  // replies of a whole page in one request, so toggling a thread needs no fetch
+  const loadReplies = async (rows) => {
+    const ids = rows.map((f) => f.id);
+    setRepliesMap((m) => ({
+      ...m,
+      ...Object.fromEntries(ids.map((id) => [id, { phase: "loading", items: [], error: null }])),
+    }));
+    try {
+      const grouped = await getRepliesBatch(ids);
+      setRepliesMap((m) => ({
+        ...m,
+        ...Object.fromEntries(ids.map((id) => [id, { phase: "ready", items: grouped[id] ?? [], error: null }])),
+      }));
+    } catch (e) {
+      setRepliesMap((m) => ({
+        ...m,
+        ...Object.fromEntries(ids.map((id) => [id, { phase: "error", items: [], error: e.message || String(e) }])),
+      }));
+    }
+  };
+
+  const load = async (after = null, term = search) => {
+    const request = ++latest.current;
     setPhase("loading");
     setError(null);
     try {
-      const rows = await getFeedbacks();
-      setData(Array.isArray(rows) ? rows : []);
+      const page = await getFeedbacksPage({ cursor: after, ...(term ? { search: term } : {}) });
+      if (request !== latest.current) return;
+      const rows = Array.isArray(page?.items) ? page.items : [];
+      setData((cur) => (after ? [...cur, ...rows] : rows));
+      setCursor(page?.next_cursor ?? null);
       setPhase("ready");
+      loadReplies(rows);
     } catch (e) {
+      if (request !== latest.current) return;
       setError(e.message || String(e));
       setPhase("error");
     }
   };
 
+  // search runs on the server over all feedback; a new term starts again from the first page
+  const term = q.trim();
   useEffect(() => {
-    load();
-  }, []);
-
-  const filtered = useMemo(() => {
-    const s = q.trim().toLowerCase();
-    if (!s) return data;
-    return data.filter((f) =>
-      [f.title, f.description, f.type].filter(Boolean).some((x) => String(x).toLowerCase().includes(s))
-    );
-  }, [data, q]);
+    const timer = setTimeout(() => {
+      setSearch(term);
+      setCursor(null);
+      load(null, term);
+    }, phase === "idle" ? 0 : 300); // no debounce for the first load
+    return () => clearTimeout(timer);
+  }, [term]);
 
   // authentication
   const [perms, setPerms] = useState(true)
@@ -82,7 +113,7 @@ export default function FeedbackPage() {
     setOpenId(fid);
 
     const cached = repliesMap[fid];
-    if (cached && (cached.items?.length || cached.phase === "loading" || cached.phase === "error")) {
+    if (cached && (cached.items?.length || cached.phase === "loading" || cached.phase === "ready")) {
       return;
     }
 
@@ -211,7 +242,7 @@ const rollbackOptimistic = (fid, tempId) => {
 
           {/* List */}
           <div className="divide-y divide-neutral-200/80">
-            {filtered.map((f, i) => {
+            {data.map((f, i) => {
               const isOpen = openId === f.id;
               const rState = repliesMap[f.id]; // { phase, items, error }
               const repliesCount = rState?.items?.length ?? 0;
@@ -240,13 +271,23 @@ const rollbackOptimistic = (fid, tempId) => {
               );
             })}
 
-            {phase === "ready" && filtered.length === 0 && (
+            {phase === "ready" && data.length === 0 && (
               <p className="py-6 text-center text-xs text-neutral-500">No feedback found.</p>
             )}
           </div>
 
+          {cursor && phase !== "loading" && (
+            <button
+              type="button"
+              onClick={() => load(cursor)}
+              className="mt-3 w-full rounded-xl border border-neutral-200 py-2 text-[13px] font-semibold text-blue-600 hover:bg-neutral-50"
+            >
+              Load more
+            </button>
+          )}
+
           {/* “Others” footer row */}
-          {phase === "ready" && filtered.length > 0 && (
+          {phase === "ready" && data.length > 0 && (
             <div className="mt-2 text-[12px] text-neutral-500">Others</div>
           )}
         </div>
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react'
-import { getStationCrowdDensityForecast } from '../services/api'
+import { getStationCrowdDensityForecastAllLines } from '../services/api'
 
 const LINES = ['CCL','CEL','CGL','DTL','EWL','NEL','NSL','BPL','SLRT','PLRT','TEL']
 const LineDesc = ['Circle Line','Circle Line Extension : Marina Bay','Changi Extension','Downtown Line','East West Line','North East Line','North South Line','Bukit Panjang LRT','Sengkang LRT',' Punggol LRT','Thomson-East Coast Line']
@@ -16,27 +16,14 @@ export default function StationDensityForecast() {
       setLoading(true)
       setError(null)
       try {
-        const promises = LINES.map((line) =>
-          getStationCrowdDensityForecast(line)
-            .then((res) => ({ line, ok: true, payload: res }))
-            .catch((err) => ({ line, ok: false, error: err }))
-        )
-        const results = await Promise.all(promises)
-        console.log(results)
-
-        const normalized = results.map((r) => {
-          if (!r.ok) return { line: r.line, error: r.error?.message || String(r.error), stations: [], count: 0 }
-
-          let payload = r.payload
-          let stations = []
-          if (Array.isArray(payload)) stations = payload
-          else if (payload && Array.isArray(payload.value)) stations = payload.value
-          else if (payload && Array.isArray(payload.results)) stations = payload.results
-          else if (payload && Array.isArray(payload.data)) stations = payload.data
-          else stations = []
-
-          return { line: r.line, stations, count: stations.length }
-        })
+        // one request for every line; the backend fans out and caches per line
+        const { lines } = await getStationCrowdDensityForecastAllLines()
+        const normalized = lines.map((l) => ({
+          line: l.line,
+          stations: l.stations,
+          count: l.count,
+          ...(l.error ? { error: l.error } : {}),
+        }))
 
         setLinesData(normalized)
       } catch (e) {
@@ -55,7 +42,13 @@ export default function StationDensityForecast() {
 
   const getStationLabel = (s) => s.StationCode ?? s.StationID ?? s.Station ?? s.StationName ?? '—'
   const getStationName = (s) => s.Station ?? 'Unknown station'
-  const getDensity = (s) => s.CrowdLevel ?? 'N/A'
+  // forecast rows carry the day's half-hour intervals; show the one covering now
+  const currentInterval = (s) => {
+    const now = Date.now()
+    const started = (s.Intervals || []).filter((i) => Date.parse(i.Start) <= now)
+    return started.length ? started[started.length - 1] : (s.Intervals || [])[0]
+  }
+  const getDensity = (s) => s.CrowdLevel ?? currentInterval(s)?.CrowdLevel ?? 'N/A'
 
   const densityMap = (d) => {
     switch (d) {
@@ -1,11 +1,34 @@
 import React, { useEffect, useState } from 'react'
-import { getStationCrowdDensityRealtime } from '../services/api'
+import { getStationCrowdDensityRealtimeAllLines, streamCrowdDensity } from '../services/api'
 import { user_loggedin } from '../supabaseClient'
 import FooterNav from '../components/FooterNav'
 
 const LINES = ['CCL','CEL','CGL','DTL','EWL','NEL','NSL','BPL','SLRT','PLRT','TEL']
 const LineDesc = ['Circle Line','Circle Line Extension : Marina Bay','Changi Extension','Downtown Line','East West Line','North East Line','North South Line','Bukit Panjang LRT','Sengkang LRT',' Punggol LRT','Thomson-East Coast Line']
 
+// apply a crowd density stream event ('snapshot' or a per-line 'update') to one line
+const applyStreamEvent = (l, type, msg) => {
+  let stations
+  if (type === 'snapshot') {
+    stations = msg.data[l.line]
+  } else if (msg.key !== l.line) {
+    return l
+  } else if (msg.replace) {
+    stations = msg.replace
+  } else {
+    const removed = new Set(msg.remove || [])
+    const upserts = new Map((msg.upsert || []).map((s) => [s.Station, s]))
+    stations = (l.stations || []).filter((s) => !removed.has(s.Station)).map((s) => {
+      const updated = upserts.get(s.Station)
+      upserts.delete(s.Station)
+      return updated ?? s
+    })
+    stations.push(...upserts.values())
+  }
+  if (!Array.isArray(stations)) return l
+  return { line: l.line, stations, count: stations.length }
+}
+
 export default function StationDensityRealTime() {
   const [linesData, setLinesData] = useState([])
   const [loading, setLoading] = useState(true)
@@ -14,32 +37,27 @@ export default function StationDensityRealTime() {
   const [searchText, setSearchText] = useState('')
 
   useEffect(() => {
+    let source = null
+    let cancelled = false
     const fetchAll = async () => {
       setLoading(true)
       setError(null)
       try {
-        const promises = LINES.map((line) =>
-          getStationCrowdDensityRealtime(line)
-            .then((res) => ({ line, ok: true, payload: res }))
-            .catch((err) => ({ line, ok: false, error: err }))
-        )
-        const results = await Promise.all(promises)
-
-        const normalized = results.map((r) => {
-          if (!r.ok) return { line: r.line, error: r.error?.message || String(r.error), stations: [], count: 0 }
-
-          let payload = r.payload
-          let stations = []
-          if (Array.isArray(payload)) stations = payload
-          else if (payload && Array.isArray(payload.value)) stations = payload.value
-          else if (payload && Array.isArray(payload.results)) stations = payload.results
-          else if (payload && Array.isArray(payload.data)) stations = payload.data
-          else stations = []
-
-          return { line: r.line, stations, count: stations.length }
-        })
-
+        // one request for every line; the backend fans out and caches per line
+        const { lines } = await getStationCrowdDensityRealtimeAllLines()
+        const normalized = lines.map((l) => ({
+          line: l.line,
+          stations: l.stations,
+          count: l.count,
+          ...(l.error ? { error: l.error } : {}),
+        }))
+
+        if (cancelled) return
         setLinesData(normalized)
+        // then keep the levels current from the server's change stream
+        source = streamCrowdDensity((type, msg) => {
+          setLinesData((current) => current.map((l) => applyStreamEvent(l, type, msg)))
+        })
       } catch (e) {
         setError(e.message || String(e))
       } finally {
@@ -48,6 +66,10 @@ export default function StationDensityRealTime() {
     }
 
     fetchAll()
+    return () => {
+      cancelled = true
+      if (source) source.close()
+    }
   }, [])
 
   // authentication
@@ -1,72 +1,39 @@
 import React, { useEffect, useState } from 'react'
-import { trainServiceAlerts } from '../services/api'
+import { streamTrainServiceAlerts } from '../services/api'
 import { user_loggedin } from '../supabaseClient'
 import FooterNav from '../components/FooterNav'
 
+// DataMall's TrainServiceAlerts value is {Status, AffectedSegments, Message};
+// show one card per affected segment, carrying the overall status
+const toAlerts = (value) => {
+  const feeds = Array.isArray(value) ? value : value ? [value] : []
+  return feeds.flatMap((feed) =>
+    (feed.AffectedSegments || []).map((segment) => ({ Status: feed.Status, ...segment }))
+  )
+}
+
 export default function TrainServiceAlerts() {
   const [alerts, setAlerts] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
 
   useEffect(() => {
-    let mounted = true
-    const fetchAlerts = async () => {
-      setLoading(true)
+    // the backend pushes a snapshot on connect and the whole alerts value on every change
+    let received = false
+    const source = streamTrainServiceAlerts((type, data) => {
+      received = true
+      const value = type === 'snapshot' ? data.data?.alerts : data.replace
+      setAlerts(toAlerts(value))
       setError(null)
-      try {
-
-        // replaced with example response for now
-        // because there are no service alerts
-        // const res = await trainServiceAlerts()
-
-        const res = [
-          {
-            "Status": 2,
-            "Line": "NEL",
-            "Direction": "towards HarbourFront",
-            "Stations": "Serangoon; Woodleigh; Potong Pasir",
-            "FreePublicBus": ["Serangoon Bus Interchange"],
-            "FreeMRTShuttle": ["Woodleigh", "Potong Pasir"]
-          },
-          {
-            "Status": 2,
-            "Line": "EWL",
-            "Direction": "towards Pasir Ris",
-            "Stations": "Bugis; Lavender",
-            "FreePublicBus": [],
-            "FreeMRTShuttle": []
-          },
-          {
-            "Status": 1,
-            "Line": "DTL",
-            "Direction": "towards Bukit Panjang",
-            "Stations": "",
-            "FreePublicBus": [],
-            "FreeMRTShuttle": []
-          }
-        ]
-
-
-        let items = []
-        if (Array.isArray(res)) items = res
-        else if (res && Array.isArray(res.value)) items = res.value
-        else if (res && Array.isArray(res.data)) items = res.data
-        else if (res && Array.isArray(res.results)) items = res.results
-
-        const disrupted = items
-
-        if (mounted) setAlerts(disrupted)
-      } catch (e) {
-        if (mounted) setError(e.message || String(e))
-      } finally {
-        if (mounted) setLoading(false)
-      }
-    }
-
-    fetchAlerts()
-    return () => {
-      mounted = false
+      setLoading(false)
+    })
+    source.onerror = () => {
+      // EventSource reconnects by itself; only report it if nothing has arrived yet
+      if (received) return
+      setError('Could not connect to the alerts stream')
+      setLoading(false)
     }
+    return () => source.close()
   }, [])
 
   // authentication
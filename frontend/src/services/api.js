@@ -19,6 +19,27 @@ export const getUsers = async () => {
     }
 };
 
+// Download 'users' or 'feedback' as 'csv' or 'ndjson' (admins only, so it
+// needs the bearer token and cannot be a plain <a href>).
+export const downloadExport = async (dataset, format = 'csv') => {
+    try {
+        const response = await axios.get(`${API_URL}/export/${dataset}`, {
+            params: { format },
+            headers: await authHeader(),
+            responseType: 'blob',
+        });
+        const url = URL.createObjectURL(response.data);
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `${dataset}.${format}`;
+        link.click();
+        URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Error exporting data:', error);
+        throw error;
+    }
+};
+
 export const createUser = async (userData) => {
     try {
         const response = await axios.post(`${API_URL}/users`, userData);
@@ -50,6 +71,18 @@ export const getBusArrivals = async (busStopCode) => {
     }
 }
 
+export const getBusArrivalsBatch = async (busStopCodes, serviceNos = []) => {
+    try {
+        const params = { codes: busStopCodes.join(',') };
+        if (serviceNos.length) params.services = serviceNos.join(',');
+        const response = await axios.get(`${API_URL}/busarrivals`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching data:', error);
+        throw error;
+    }
+}
+
 export const getBusServices = async () => {
     try {
         const response = await axios.get(`${API_URL}/busservices`);
@@ -70,10 +103,12 @@ export const getBusRoutes = async () => {
     }
 }
 
-export const getStationCrowdDensityRealtime = async (trainLine) => {
+// One page of a bulk dataset ('busstops', 'busservices' or 'busroutes').
+// params: field filters such as { ServiceNo: '10', Direction: 1 }, plus
+// fields (comma separated), limit and the cursor returned by the previous page.
+export const getDatasetPage = async (dataset, params = {}) => {
     try {
-        const encoded = encodeURIComponent(trainLine);
-        const response = await axios.get(`${API_URL}/stationcrowddensityrealtime/${encoded}`);
+        const response = await axios.get(`${API_URL}/${dataset}`, { params: { limit: 500, ...params } });
         return response.data;
     } catch (error) {
         console.error('Error fetching data:', error);
@@ -81,10 +116,19 @@ export const getStationCrowdDensityRealtime = async (trainLine) => {
     }
 }
 
-export const getStationCrowdDensityForecast = async (trainLine) => {
+export const getStationCrowdDensityRealtimeAllLines = async () => {
     try {
-        const encoded = encodeURIComponent(trainLine);
-        const response = await axios.get(`${API_URL}/stationcrowddensityforecast/${encoded}`);
+        const response = await axios.get(`${API_URL}/stationcrowddensityrealtime`);
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching data:', error);
+        throw error;
+    }
+}
+
+export const getStationCrowdDensityForecastAllLines = async () => {
+    try {
+        const response = await axios.get(`${API_URL}/stationcrowddensityforecast`);
         return response.data;
     } catch (error) {
         console.error('Error fetching data:', error);
@@ -112,6 +156,26 @@ export const taxiStands = async () => {
     }
 }
 
+export const taxiAvailabilityHeatmap = async (zoom, bbox) => {
+    try {
+        const response = await axios.get(`${API_URL}/taxiavailability/heatmap`, { params: { zoom, ...bbox } });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching data:', error);
+        throw error;
+    }
+}
+
+export const taxiStandsNearest = async (lat, lng, k = 5) => {
+    try {
+        const response = await axios.get(`${API_URL}/taxistands/nearest`, { params: { lat, lng, k } });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching data:', error);
+        throw error;
+    }
+}
+
 export const trainServiceAlerts = async () => {
     try {
         const response = await axios.get(`${API_URL}/trainservicealerts`);
@@ -122,6 +186,39 @@ export const trainServiceAlerts = async () => {
     }
 }
 
+// Crowd density history; `params` takes line, start, end (ISO, SGT if no offset)
+// plus kind ('realtime' | 'forecast') for averages and top / days for peaks.
+export const getCrowdHistory = async (view, params = {}) => {
+    try {
+        const response = await axios.get(`${API_URL}/crowdhistory/${view}`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching data:', error);
+        throw error;
+    }
+}
+
+export const getCrowdHistoryAverages = (params) => getCrowdHistory('averages', params);
+export const getCrowdHistoryPeaks = (params) => getCrowdHistory('peaks', params);
+export const getCrowdForecastError = (params) => getCrowdHistory('forecasterror', params);
+
+// Server-Sent Event streams: `onMessage(type, data)` gets a 'snapshot' first,
+// then an 'update' per change. Call .close() on the returned EventSource.
+const subscribe = (path, onMessage) => {
+    const source = new EventSource(`${API_URL}${path}`);
+    ['snapshot', 'update'].forEach((type) =>
+        source.addEventListener(type, (e) => onMessage(type, JSON.parse(e.data)))
+    );
+    source.onerror = (error) => console.error('Stream error:', error);
+    return source;
+}
+
+export const streamTrainServiceAlerts = (onMessage) =>
+    subscribe('/stream/trainservicealerts', onMessage);
+
+export const streamCrowdDensity = (onMessage, lines = []) =>
+    subscribe(`/stream/crowddensity${lines.length ? `?lines=${lines.join(',')}` : ''}`, onMessage);
+
 export const estimatedTravelTimes = async () => {
     try {
         const response = await axios.get(`${API_URL}/estimatedtraveltimes`);
@@ -162,6 +259,20 @@ export const getFeedbacks= async () => {
     }
 }
 
+// One page of feedback, newest first. filters: { type, rating, since, until };
+// pass the returned next_cursor as cursor to get the following page.
+export const getFeedbacksPage = async ({ cursor, limit = 50, ...filters } = {}) => {
+    try {
+        const params = { limit, ...filters };
+        if (cursor) params.cursor = cursor;
+        const response = await axios.get(`${API_URL}/feedbacks/`, { params });
+        return response.data;
+    } catch (error) {
+        console.error('Error fetching feedbacks:', error);
+        throw error;
+    }
+}
+
 export const deleteFeedback = async (id) => {
   try {
     const response = await axios.delete(`${API_URL}/feedbacks/${id}`, {
@@ -177,6 +288,13 @@ export const getReplies = async (feedbackId) => {
   return Array.isArray(data) ? data : [];
 };
 
+// Replies for many feedbacks in one request: { [feedbackId]: [replies] }
+export const getRepliesBatch = async (feedbackIds) => {
+  if (!feedbackIds.length) return {};
+  const { data } = await axios.get(`${API_URL}/feedbacks/replies`, { params: { ids: feedbackIds.join(',') } });
+  return data ?? {};
+};
+
 export const deleteReply= async (feedbackId,replyId) => {
   try {
     const response = await axios.delete(`${API_URL}/feedbacks/${feedbackId}/replies/${replyId}`, {